@@ -0,0 +1,120 @@
+################################################################################
+#
+#   Text Normalization Benchmark
+#
+#   Compares the original character-by-character clean_chars()/strip_tags()
+#   loops against the translation-table versions in normalize.py, over the
+#   same headline- and list-item-sized chunks of text the segments feed them.
+#
+#   Uses saved AP News and Wikipedia pages (see pages.py).  If neither can be
+#   loaded, falls back to a small built-in sample so there's still something
+#   to measure.
+#
+#   Run from anywhere:  python benchmarks/bench_normalize.py
+#
+################################################################################
+
+import timeit
+
+import pages
+import normalize
+
+
+FALLBACK_SAMPLE = [
+    'Lawmakers return to Washington with a “to-do” list that’s longer than ever \u2014 and time’s short…',
+    'The 1960s-era rocket\u2019s engines fired for 8\u00bd minutes, NASA said \u2013 a record for the program.',
+    'Beyonc\u00e9 and Pel\u00e9\u2019s foundation \u00a9 2023 \u2022 All rights reserved\u00ae',
+    '<a href=\\"/article/abc\\">Officials</a> say the storm\u2019s path shifted overnight.<br>More to come.',
+    '\tThe Se\u00f1ora Ca\u00f1a festival drew crowds in A\u00d1O 1492 \u2014 \u201creally big\u201d ones.',
+]
+
+
+
+########  The original implementations, for comparison  #######################
+
+def legacy_clean_chars(s):
+    new_s = ''
+    for c in s:
+        u = ord(c)
+        if u == 9:
+            new_s += '    '
+            continue
+        if u >= 0x2013:
+            if 0x2013 <= u <= 0x2017:
+                new_s += '-'
+            elif u == 0x201C or u == 0x201D:
+                new_s += '"'
+            elif u == 0x2018 or u == 0x2019:
+                new_s += "'"
+            elif u == 0x2022:
+                new_s += "*"
+            elif u == 0x2026:
+                new_s += '...'
+        elif (32 <= u <= 126):
+            new_s += c
+    return new_s.strip()
+
+
+def legacy_strip_tags(s):
+    s = s.replace('\\u003c', '<')
+    s = s.replace('\\"', '"')
+    s = s.replace('</a>', '')
+    while True:
+        start_pos = s.find('<a')
+        if start_pos < 0:
+            break
+        end_pos = s.find('>', start_pos)
+        if end_pos < 0:
+            break
+        s = s[0:start_pos] + s[end_pos+1:]
+    s = s.replace('<br>', '\n')
+    s = s.replace('<BR>', '\n')
+    return s
+
+
+
+########  Benchmark  ##########################################################
+
+def chunks_from_pages():
+    # Break the saved pages into pieces about the size of the ones segments
+    # actually clean:  AP's per-story chunks and Wikipedia's list items
+    chunks = {}
+    ap = pages.load_page('ap_news')
+    if ap is not None:
+        chunks['AP News'] = [c[:600] for c in ap.split('"firstWords":')[1:]]
+    wiki = pages.load_page('wiki_on_this_day')
+    if wiki is not None:
+        chunks['Wikipedia'] = [c.split('</li>')[0] for c in wiki.split('<li>')[1:]]
+    chunks = {name:c for name, c in chunks.items() if len(c) > 0}
+    if len(chunks) == 0:
+        print('No saved pages available, using built-in sample text\n')
+        chunks['Built-in sample'] = FALLBACK_SAMPLE * 20
+    return chunks
+
+
+def run(name, func, chunks, repeat):
+    seconds = min(timeit.repeat(lambda: [func(c) for c in chunks], number=1, repeat=repeat))
+    print(f'    {name:22} {seconds*1000:9.3f} ms')
+    return seconds
+
+
+def main(repeat=20):
+    for source, chunks in chunks_from_pages().items():
+        total_chars = sum(len(c) for c in chunks)
+        print(f'{source}:  {len(chunks)} chunks, {total_chars:,} characters')
+        old = run('legacy clean_chars', legacy_clean_chars, chunks, repeat)
+        new = run('normalize.clean_chars', normalize.clean_chars, chunks, repeat)
+        print(f'    {"speedup":22} {old/new:9.1f}x')
+        old = run('legacy strip_tags', legacy_strip_tags, chunks, repeat)
+        new = run('normalize.strip_tags', normalize.strip_tags, chunks, repeat)
+        print(f'    {"speedup":22} {old/new:9.1f}x')
+        # Results should match, apart from characters the old code dropped
+        # that now have ASCII stand-ins (accented letters, etc.)
+        differ = sum(1 for c in chunks if legacy_clean_chars(c) != normalize.clean_chars(c))
+        print(f'    clean_chars results differing: {differ} of {len(chunks)}')
+        differ = sum(1 for c in chunks if legacy_strip_tags(c) != normalize.strip_tags(c))
+        print(f'    strip_tags results differing:  {differ} of {len(chunks)}\n')
+
+
+if __name__ == '__main__':
+    main()
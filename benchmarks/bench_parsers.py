@@ -0,0 +1,140 @@
+################################################################################
+#
+#   HTML Parser Benchmark
+#
+#   Times building the soup each HTML-scraping segment needs, every way
+#   html_parsers.py can:  the whole page, or only the segment's tags, with
+#   each installed parser.  Also checks that the segment would get the same
+#   results out of each soup as it does from a full html.parser parse.
+#
+#   Uses saved Yahoo Finance, Spot the Station, and Wikipedia pages (see
+#   pages.py).  Any that can't be loaded are replaced by a made-up page of
+#   about the same size, with the segment's tags buried in it.
+#
+#   (AP News isn't here since it doesn't use a parser at all.)
+#
+#   Run from anywhere:  python benchmarks/bench_parsers.py
+#
+################################################################################
+
+import timeit
+
+import pages
+import html_parsers
+from segments import yahoo_finance, spot_the_station
+
+
+
+########  Made-up pages, for when there are no saved ones  ####################
+
+def filler(rows):
+    return ''.join(f'<div class="row r{i}"><a href="/story/{i}">Story {i}</a> '
+                   f'<span class="byline">By Someone {i}</span>'
+                   f'<p>Paragraph {i} with <b>bold</b> and <i>italic</i> words.</p></div>\n'
+                   for i in range(rows))
+
+
+def fake_page(inner, rows=3000):
+    # The wanted tags, about two-thirds of the way down a big page
+    before = filler(rows * 2 // 3)
+    after = filler(rows // 3)
+    return f'<html><head><title>Sample</title></head><body>{before}{inner}{after}</body></html>'
+
+
+def fake_yahoo():
+    inner = '<span data-id="mk-msg">U.S. markets closed</span>'
+    for symbol, price in (('^GSPC', '4,109.31'), ('^DJI', '33,274.15'), ('^IXIC', '12,221.91'),
+                          ('^RUT', '1,802.48'), ('CL=F', '75.67')):
+        inner += (f'<fin-streamer data-symbol="{symbol}" data-field="regularMarketPrice">{price}</fin-streamer>'
+                  f'<fin-streamer data-symbol="{symbol}" data-field="regularMarketChange"><span>+12.34</span></fin-streamer>'
+                  f'<fin-streamer data-symbol="{symbol}" data-field="regularMarketChangePercent"><span>(+0.56%)</span></fin-streamer>')
+    return fake_page(inner)
+
+
+def fake_spot():
+    sightings = '|'.join(f'2023-04-{d:02} 20:13:00.0,Mon Apr {d},8:13 PM,4 min,45,10° above NW,10° above SE'
+                         for d in range(10, 20))
+    return fake_page(f'<div id="widget_info">{sightings}</div>')
+
+
+def fake_wiki():
+    items = ''.join(f'<li><a href="/wiki/{y}">{y}</a> – Something happened in year {y}.</li>'
+                    for y in range(1800, 1810))
+    return fake_page(f'<ul>{items}</ul>', rows=600)
+
+
+
+########  What each segment pulls out of its soup  #############################
+
+def yahoo_results(soup):
+    return yahoo_finance.Segment.parse_indexes(soup.find_all('fin-streamer'))
+
+
+def spot_results(soup):
+    div = soup.find_all('div', {'id': 'widget_info'})
+    return [str(d.contents[0]) for d in div]
+
+
+def wiki_results(soup):
+    return [li.text for li in soup.find_all('ul')[0].find_all('li')]
+
+
+def wiki_chunk(page):
+    # The part of the page the segment actually parses
+    link = f'<a href="/wiki/{pages.TODAY.replace(" ", "_")}" title="{pages.TODAY}">{pages.TODAY}</a>'
+    chunks = page.split(link)
+    return chunks[2] if len(chunks) > 2 else None
+
+
+def load(name, fake):
+    text = pages.load_page(name)
+    if name == 'wiki_on_this_day' and text is not None:
+        text = wiki_chunk(text)
+    if text is None:
+        print(f'    (using a made-up page for {name})')
+        return fake()
+    return text
+
+
+def segments():
+    return [('Yahoo Finance', load('yahoo_finance', fake_yahoo), yahoo_finance.Segment.page_tags, yahoo_results),
+            ('Spot the Station', load('spot_the_station', fake_spot), spot_the_station.Segment.page_tags,
+             spot_results),
+            ('Wikipedia', load('wiki_on_this_day', fake_wiki), ['ul'], wiki_results),
+           ]
+
+
+
+########  Benchmark  ##########################################################
+
+def run(text, parser, only, repeat):
+    return min(timeit.repeat(lambda: html_parsers.make_soup(text, parser, only), number=1, repeat=repeat))
+
+
+def main(repeat=5):
+    installed = [p for p in ('html.parser', 'lxml', 'selectolax') if html_parsers.is_installed(p)]
+    print(f'Parsers installed: {", ".join(installed)}\n')
+    for name, text, only, results in segments():
+        print(f'{name}:  {len(text):,} characters, keeping {only}')
+        expected = results(html_parsers.make_soup(text, 'html.parser'))
+        baseline = None
+        for parser in installed:
+            for filtered in (False, True):
+                if parser == 'selectolax' and not filtered:
+                    continue
+                wanted = only if filtered else None
+                seconds = run(text, parser, wanted, repeat)
+                if baseline is None:
+                    baseline = seconds
+                try:
+                    same = results(html_parsers.make_soup(text, parser, wanted)) == expected
+                except Exception:
+                    same = False
+                label = f'{parser}{", filtered" if filtered else ""}'
+                print(f'    {label:24} {seconds*1000:9.1f} ms  {baseline/seconds:6.1f}x'
+                      f'  {"same results" if same else "RESULTS DIFFER"}')
+        print()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+################################################################################
+#
+#   Saved Pages for Benchmarks
+#
+#   The benchmarks run against real pages from the sites the segments scrape.
+#   The first time a page is needed, it's fetched and saved in
+#   benchmarks/pages/, and the saved copy is used from then on so results are
+#   repeatable (and the sites aren't hit on every run).  To benchmark against
+#   different pages, just drop them in that directory with the same names.
+#
+################################################################################
+
+import datetime as dt
+import os
+import sys
+
+# Let the benchmarks import RetroFeed modules when run from anywhere
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+PAGE_DIR = os.path.join(ROOT, 'benchmarks', 'pages')
+
+TODAY = dt.date.today().strftime('%B %d').replace(' 0', ' ')
+
+URLS = {'ap_news':'https://apnews.com',
+        'wiki_on_this_day':'https://en.wikipedia.org/wiki/Wikipedia:Selected_anniversaries/' + TODAY.replace(' ', '_'),
+        'yahoo_finance':'https://finance.yahoo.com',
+        'spot_the_station':'https://spotthestation.nasa.gov/sightings/view.cfm?country=United_States&region=Tennessee&city=Nashville',
+       }
+
+
+
+def load_page(name):
+    # Returns the saved page's text, fetching and saving it first if needed,
+    # or None if it isn't saved and can't be fetched
+    path = os.path.join(PAGE_DIR, name + '.html')
+    if not os.path.exists(path):
+        try:
+            import requests
+            response = requests.get(URLS[name], timeout=(5, 30))
+        except Exception as e:
+            print(f'Could not fetch {name}: {e}')
+            return None
+        if response.status_code != 200:
+            print(f'Could not fetch {name}: HTTP {response.status_code}')
+            return None
+        os.makedirs(PAGE_DIR, exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(response.text)
+    with open(path, encoding='utf-8') as f:
+        return f.read()
@@ -0,0 +1,134 @@
+################################################################################
+#
+#   Circuit Breaker Class
+#
+#   Keeps track of how requests to one host have been going, and stops
+#   sending them for a while once it looks like the host is down.  That way
+#   a dead site costs one quick "no" per refresh rather than a timeout every
+#   time, and the segment just goes on showing the data it already has.
+#
+#   - Closed:     The normal state.  Requests go through.  After [failures]
+#                 failed requests in a row, the breaker opens.
+#   - Open:       Requests are turned away without being sent, until the
+#                 backoff time is up.  The backoff doubles every time the
+#                 breaker opens again (up to max_backoff), with some random
+#                 jitter so several Pis don't all come back at once.
+#   - Half-open:  The backoff is up.  One trial request is let through.  If
+#                 it works, the breaker closes again.  If not, it reopens.
+#
+#   A failure is no response at all, a 5xx or 429 status, or (if slow_seconds
+#   is set) a response that took longer than that.
+#
+#   allow() hands back a token for each request it lets through, to pass to
+#   record() along with how it went.  Only the trial request's result can
+#   close or reopen a half-open breaker.  Requests that were already under
+#   way when the breaker opened still count in the totals, but don't move
+#   it.
+#
+#   Used by HttpClient, which keeps one per host.
+#
+################################################################################
+
+import random
+import threading
+
+from clock import Clock
+
+
+class CircuitBreaker:
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    # What allow() returns for a request it lets through
+    REGULAR = 'regular'
+    TRIAL = 'trial'
+
+    def __init__(self, failures=3, backoff=30, max_backoff=900, slow_seconds=None, clock=None):
+        self.max_failures = failures
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.slow_seconds = slow_seconds
+        self._clock = clock if clock is not None else Clock()
+        self._lock = threading.Lock()
+        self.state = self.CLOSED
+        self.failures = 0          # In a row
+        self.opens = 0             # Times opened without a success since
+        self.retry_at = 0.0        # Monotonic time the open state ends
+        self._trial_running = False
+        # Running totals, for stats()
+        self.successes = 0
+        self.total_failures = 0
+        self.rejected = 0
+        self.latency = None        # Smoothed seconds per request
+
+
+    def allow(self):
+        # Returns a token for record() if a request should be sent now, or
+        # None if not
+        with self._lock:
+            if self.state == self.CLOSED:
+                return self.REGULAR
+            if self.state == self.OPEN and self._clock.monotonic() >= self.retry_at:
+                self.state = self.HALF_OPEN
+            if self.state == self.HALF_OPEN and not self._trial_running:
+                self._trial_running = True
+                return self.TRIAL
+            self.rejected += 1
+            return None
+
+
+    def is_failure(self, status, seconds):
+        if status is None or status >= 500 or status == 429:
+            return True
+        return self.slow_seconds is not None and seconds > self.slow_seconds
+
+
+    def record(self, token, status, seconds):
+        # Note how a request that allow() let through turned out
+        failed = self.is_failure(status, seconds)
+        with self._lock:
+            trial = token == self.TRIAL
+            if trial:
+                self._trial_running = False
+            if status is not None:
+                self.latency = seconds if self.latency is None else self.latency * 0.8 + seconds * 0.2
+            if failed:
+                self.total_failures += 1
+            else:
+                self.successes += 1
+            if not trial and self.state != self.CLOSED:
+                # Sent before the breaker opened.  Too late to matter.
+                return
+            if not failed:
+                self.state = self.CLOSED
+                self.failures = 0
+                self.opens = 0
+                return
+            self.failures += 1
+            if trial or self.failures >= self.max_failures:
+                self._open()
+
+
+    def _open(self):
+        # Call with the lock held
+        self.opens += 1
+        delay = min(self.backoff * 2 ** (self.opens - 1), self.max_backoff)
+        # "Equal jitter":  somewhere between half and all of the full delay
+        delay = delay / 2 + random.uniform(0, delay / 2)
+        self.state = self.OPEN
+        self.retry_at = self._clock.monotonic() + delay
+
+
+    def stats(self):
+        with self._lock:
+            retry_in = max(0.0, self.retry_at - self._clock.monotonic()) if self.state == self.OPEN else 0.0
+            return {'state':self.state,
+                    'failures_in_a_row':self.failures,
+                    'successes':self.successes,
+                    'failures':self.total_failures,
+                    'rejected':self.rejected,
+                    'retry_in':round(retry_in, 1),
+                    'latency':round(self.latency, 3) if self.latency is not None else None,
+                   }
@@ -0,0 +1,88 @@
+################################################################################
+#
+#   Clock Classes
+#
+#   All of RetroFeed's sleeping and time-telling goes through a clock object,
+#   which the Display owns and hands out (as 'd.clock') to everything else.
+#
+#   Clock:           The real thing.  Just wraps the time and datetime modules.
+#
+#   SimulatedClock:  Time only moves when something sleeps, and then it jumps
+#                    ahead instantly.  A whole day of playlist cycles, with
+#                    every scheduled refresh, can run in a few seconds.
+#                    (The fetching itself still takes however long it takes.)
+#
+#   Segments should use self.clock.now() (or self.d.clock.now()) rather than
+#   calling dt.datetime.now() themselves, so they play along with simulation.
+#
+################################################################################
+
+import datetime as dt
+import threading
+import time
+
+
+class Clock:
+
+    def monotonic(self):
+        # Seconds, for measuring intervals.  Never goes backwards.
+        return time.monotonic()
+
+    def time(self):
+        # Seconds since the epoch
+        return time.time()
+
+    def sleep(self, seconds):
+        if seconds > 0:
+            time.sleep(seconds)
+
+    def now(self):
+        # Current local date and time, as a naive datetime
+        return dt.datetime.now()
+
+    def utcnow(self):
+        # Current UTC date and time, as a naive datetime
+        return dt.datetime.utcnow()
+
+    def today(self):
+        return self.now().date()
+
+
+
+class SimulatedClock(Clock):
+
+    def __init__(self, start=None):
+        # Starts at the given local datetime, or the real current time
+        if start is None:
+            start = dt.datetime.now()
+        self._start = start
+        self._elapsed = 0.0
+        # Keep the real UTC offset, so local/UTC conversions still work
+        self._utc_offset = dt.datetime.utcnow() - dt.datetime.now()
+        self._epoch_start = start.timestamp()
+        self._lock = threading.Lock()
+
+    @property
+    def elapsed(self):
+        # Simulated seconds since the clock was created
+        return self._elapsed
+
+    def advance(self, seconds):
+        with self._lock:
+            self._elapsed += seconds
+
+    def monotonic(self):
+        return self._elapsed
+
+    def time(self):
+        return self._epoch_start + self._elapsed
+
+    def sleep(self, seconds):
+        if seconds > 0:
+            self.advance(seconds)
+
+    def now(self):
+        return self._start + dt.timedelta(seconds=self._elapsed)
+
+    def utcnow(self):
+        return self.now() + self._utc_offset
@@ -9,16 +9,77 @@
 #   functions for all text display, including linefeeds, headers, update
 #   messages, and pauses ("beats") within the segment.
 #
+#   Optional display settings, beyond the ones shown in retrofeed.py:
+#
+#       render_thread       True/False (default = False).  If true, printing
+#                           methods just queue up their output and return
+#                           right away.  A separate thread types everything
+#                           out at the configured pace, so segments can get on
+#                           with fetching and formatting in the meantime.
+#                           If writing to the output fails on that thread,
+#                           the error is raised by the next printing method
+#                           (or drain()) instead.
+#       render_queue_size   Maximum number of queued output operations before
+#                           printing methods block and wait for the render
+#                           thread to catch up (default = 256)
+#       output              Where the characters go.  Either the name of a
+#                           module in the "outputs" directory, or a dictionary
+#                           with a 'module' key plus any initialization
+#                           parameters for that output.  Default = 'stdout'.
+#                           See output_parent.py for details.
+#       newline_mode        How newline() moves to the next line.  'spaces'
+#                           types out a full line of spaces, one at a time.
+#                           'cursor' gets the same look and timing by moving
+#                           the cursor with ANSI escape sequences, using just
+#                           one write per line (plus one for any mid-line
+#                           pause).  'auto' (the default) uses 'cursor' if the
+#                           output supports it, otherwise 'spaces'.
+#       mirror              Dictionary of settings for serving the feed to
+#                           network viewers over telnet and HTTP, in addition
+#                           to the regular output.  See mirror.py for details.
+#       record              Path of an asciicast file to record all output
+#                           to.  See recording.py for details.
+#       layout_cache_items  Limits on the cache of wrapped text layouts, in
+#       layout_cache_bytes  number of strings and approximate bytes of memory
+#                           (defaults = 512 and 1,000,000)
+#       pacing_stats        True, or a dictionary of settings, to measure how
+#                           closely output keeps to the configured speeds and
+#                           log a summary every so often.  See
+#                           pacing_stats.py for details.
+#       backlog_pacing      True/False (default = False).  If true, and the
+#                           output can report how much of what's been written
+#                           to it is still waiting to be shown (stdout can,
+#                           on a terminal), writing holds off whenever more
+#                           than max_backlog bytes are waiting.  Keeps the
+#                           pace, beats, and pauses in step with what's
+#                           really on the screen when the console can't keep
+#                           up with the configured speeds.
+#       max_backlog         Bytes allowed to wait before writing holds off
+#                           (default = 16)
+#
 ################################################################################
 
+import importlib
+import queue
 import random
 import textwrap
-import time
+import threading
+
+from clock import Clock
+from layout_cache import LayoutCache
+from mirror import MirrorServer
+import normalize
+from pacer import Pacer
+from pacing_stats import PacingStats
+from recording import Recorder
 
 
 class Display:
     
-    def __init__(self, display_settings):
+    # An already-created Output object can be passed in directly, in which
+    # case the 'output' display setting is ignored.  Likewise, a Clock object
+    # (see clock.py) can be passed in for all the sleeping and time-telling.
+    def __init__(self, display_settings, output=None, clock=None):
         # Use sensible defaults if any of the keys are missing
         self._height = display_settings.get('height', 24)
         self._width = display_settings.get('width', 40)
@@ -31,6 +92,45 @@ class Display:
         self._verbose_updates = display_settings.get('verbose_updates', True)
         self._prefer_24hr_time = display_settings.get('prefer_24hr_time', True)
         self._show_intros = display_settings.get('show_intros', True)
+        self._clock = clock if clock is not None else Clock()
+        self._layout_cache = LayoutCache(display_settings.get('layout_cache_items', 512),
+                                         display_settings.get('layout_cache_bytes', 1_000_000))
+        # Set up the output, then have the pacer schedule all writes to it
+        if output is None:
+            output = self.create_output(display_settings.get('output', 'stdout'))
+        self._output = output
+        self._pacing_stats = None
+        if display_settings.get('pacing_stats', False):
+            self._pacing_stats = PacingStats(display_settings['pacing_stats'], self._clock)
+        self._backlog_pacing = display_settings.get('backlog_pacing', False)
+        backlog = self._output.backlog if self._backlog_pacing else None
+        self._pacer = Pacer(self._write, clock=self._clock, stats=self._pacing_stats,
+                            backlog=backlog, max_backlog=display_settings.get('max_backlog', 16))
+        # Functions that get a copy of everything written to the output
+        self._listeners = []
+        self._mirror = None
+        if display_settings.get('mirror', None) is not None:
+            self._mirror = MirrorServer(display_settings['mirror'], self.height, self.width)
+            self.add_listener(self._mirror.publish)
+        self._recorder = None
+        if display_settings.get('record', None) is not None:
+            self._recorder = Recorder(display_settings['record'], self.height, self.width, self._clock)
+            self.add_listener(self._recorder.record)
+        newline_mode = display_settings.get('newline_mode', 'auto')
+        if newline_mode == 'auto':
+            newline_mode = 'cursor' if self._output.supports_ansi() else 'spaces'
+        self._cursor_newlines = (newline_mode == 'cursor')
+        # Column the cursor is in, as far as printing has moved it.  Cursor
+        # newlines are only used from column 0, since cursor moves stop at
+        # the right edge where spaces would wrap.
+        self._column = 0
+        # Optionally hand the pacing off to a separate render thread
+        self._render_queue = None
+        self._render_error = None
+        self._render_stats = {'ops':0, 'high_water':0, 'blocked':0, 'blocked_seconds':0.0}
+        if display_settings.get('render_thread', False):
+            self._render_queue = queue.Queue(display_settings.get('render_queue_size', 256))
+            threading.Thread(target=self._render_loop, name='render', daemon=True).start()
         
     # Getters, but no setters (to hopefully keep other code from altering display values)
     @property
@@ -81,6 +181,18 @@ class Display:
     def show_intros(self):
         return self._show_intros
 
+    @property
+    def output(self):
+        return self._output
+
+    @property
+    def mirror(self):
+        return self._mirror
+
+    @property
+    def clock(self):
+        return self._clock
+
     def __str__(self):
         s = f'Display: {self.height} Rows, {self.width} Columns, '
         s += f'{self.cps} CPS (Print Delay: {self.print_delay}s), '
@@ -91,6 +203,9 @@ class Display:
         s += f'Verbose Updates: {self.verbose_updates}, '
         s += f'24hr Time: {self.prefer_24hr_time}'
         s += f'Show Intros: {self.show_intros}'
+        s += f', Render Thread: {self._render_queue is not None}'
+        s += f', Output: {type(self.output).__module__}'
+        s += f', Cursor Newlines: {self._cursor_newlines}'
         return s
         
         
@@ -101,43 +216,80 @@ class Display:
     def wait_beats(self, n=1):
         if n < 0:
             n = 1
-        for i in range(n):
-            time.sleep(self.beat_delay)
+        self._pause(n * self.beat_delay)
 
     # Slooow version of print()
     # Passed strings should usually be mixed case to give the user the option
     # to see them that way if they conifg force_uppercase to be false
     def print(self, s='', end='\n'):
-        # Use wrapping if string is longer than display width
-        if len(s) > self.width:
+        for line in self.layout(s):
+            self._emit(line + end, self.print_delay)
+
+    # Returns the lines that print() would display for string s:  wrapped if
+    # it's longer than display width, and uppercased if configured.  Layouts
+    # of long strings are cached, since the same ones tend to come around
+    # every playlist cycle.  (Short ones are quicker to just redo.)
+    def layout(self, s):
+        if len(s) <= self.width:
+            return (s.upper() if self._force_uppercase else s,)
+        key = (s, self.width, self._force_uppercase)
+        lines = self._layout_cache.get(key)
+        if lines is None:
             lines = textwrap.wrap(s, self.width)
-            for line in lines:
-                # Oooh... recursion!
-                self.print(line, end=end)
-            return
-        for c in s:
             if self._force_uppercase:
-                c = c.upper()
-            print(c, end='', flush=True)
-            time.sleep(self.print_delay) 
-        print(end, end='', flush=True)
-        time.sleep(self.print_delay)
+                lines = [line.upper() for line in lines]
+            lines = tuple(lines)
+            self._layout_cache.put(key, lines)
+        return lines
+
+    # Returns hit/miss and memory statistics for the layout cache
+    def layout_stats(self):
+        return self._layout_cache.stats()
 
     # Slooow Newline - Print n spaces with pause for an extra "delay"
     # seconds at some random horizontal point
     def newline(self, delay=None):
         # Pick a random position to pause to avoid(?) screen burn-in
         pause_pos = random.randrange(self.width)
-        for i in range(self.width):
-            print(' ', end='', flush=True)
-            time.sleep(self.newline_delay)
-            if i == pause_pos and delay is not None:
-                time.sleep(delay)
-        print(flush=True)
-        time.sleep(self.newline_delay)
+        if self._cursor_newlines and self._column == 0:
+            self._cursor_newline(pause_pos, delay)
+            return
+        if delay is None:
+            self._emit(' ' * self.width + '\n', self.newline_delay, 'newline')
+            return
+        self._emit(' ' * (pause_pos + 1), self.newline_delay, 'newline')
+        self._pause(delay, 'newline')
+        self._emit(' ' * (self.width - pause_pos - 1) + '\n', self.newline_delay, 'newline')
+
+    # Clear the screen and start the cursor at the bottom line, where new
+    # text scrolls in
+    def clear(self):
+        self._column = 0
+        self._submit(self._clear_now)
+
+    # Display a RenderPlan (see render_plan.py) that a segment has prepared
+    # ahead of time.  Text in the plan is already laid out, so all that's left
+    # is the paced output itself.
+    def play(self, plan):
+        for op in plan.ops:
+            if op[0] == 'text':
+                self._emit(op[1], self.print_delay)
+            elif op[0] == 'newline':
+                self.newline(op[1])
+            elif op[0] == 'beats':
+                self.wait_beats(op[1])
+
+    # Send text straight to the output, as is, with no pacing
+    def write_raw(self, s):
+        self._submit(self._write, s)
 
     # Display the passed string as a segment header, surrounded by markers
     def print_header(self, s, left_marker=' ', right_marker=None):
+        for part, end in self.header_parts(s, left_marker, right_marker):
+            self.print(part, end=end)
+
+    # Returns the (string, end) pairs that print_header() prints
+    def header_parts(self, s, left_marker=' ', right_marker=None):
         if right_marker is None:
             right_marker = left_marker
         s = s.strip()
@@ -146,10 +298,10 @@ class Display:
         num_markers = 0
         if len(s) + 4 < self.width:
             num_markers = int((self.width - 4 - len(s)) / 2)
-        self.print(left_marker * num_markers, end='')
-        self.print('  ' + s + '  ', end='')
-        self.print(right_marker * num_markers, end='')
-        self.print()
+        return [(left_marker * num_markers, ''),
+                ('  ' + s + '  ', ''),
+                (right_marker * num_markers, ''),
+                ('', '\n')]
 
     # Display passed string as an "updating..." message
     def print_update_msg(self, m):
@@ -162,6 +314,141 @@ class Display:
             self.print(']')
             self.newline()
 
+    # Wait until everything queued for the render thread has been displayed.
+    # Returns immediately if we're not using a render thread.
+    def drain(self):
+        if self._render_queue is not None:
+            self._render_queue.join()
+            self._raise_render_error()
+
+    # Returns a copy of the render queue statistics.  'high_water' is the
+    # most operations ever waiting at once, 'blocked' is how many times a
+    # printing method had to wait for room in the queue.
+    def render_stats(self):
+        stats = dict(self._render_stats)
+        if self._render_queue is not None:
+            stats['queued'] = self._render_queue.qsize()
+        return stats
+
+    # Returns a copy of the output backlog statistics, or None if the
+    # 'backlog_pacing' setting is off.  'bytes' is how much was waiting to be
+    # shown at the last check, 'drain_cps' is how fast the output has been
+    # seen to actually show it, and 'latency' is how many seconds behind the
+    # screen was at the last check, going by that rate.
+    def backlog_stats(self):
+        if not self._backlog_pacing:
+            return None
+        return dict(self._pacer.backlog_stats)
+
+    # Returns the pacing summary for the current period (see pacing_stats.py),
+    # or None if the 'pacing_stats' setting is off
+    def pacing_stats(self):
+        if self._pacing_stats is None:
+            return None
+        return self._pacing_stats.report()
+
+
+########  Output plumbing  ####################################################
+
+    # All printing methods above funnel through these two.  They either do
+    # the paced output right here or pass it along to the render thread.
+    # 'kind' is just for the pacing stats:  'char', 'newline', or 'beat'.
+    def _emit(self, s, delay, kind='char'):
+        line_end = s.rfind('\n')
+        self._column = self._column + len(s) if line_end < 0 else len(s) - line_end - 1
+        if not self._output.paced or self._output.line_paced:
+            delay = 0
+        self._submit(self._pacer.emit, s, delay, kind)
+
+    def _pause(self, seconds, kind='beat'):
+        if self._output.paced:
+            self._submit(self._pacer.pause, seconds, kind)
+
+    # Same as typing out a line of spaces, as far as the viewer can tell, but
+    # rather than writing each space we just wait the time it would have
+    # taken, moving the cursor in one hop if there's a pause to show.  Only
+    # used at the start of a line.
+    def _cursor_newline(self, pause_pos, delay):
+        if not self._output.paced or self._output.line_paced:
+            if delay is not None:
+                self._pause(delay, 'newline')
+            self._submit(self._pacer.emit, '\n', 0, 'newline')
+            return
+        spaces_left = self.width
+        if delay is not None:
+            self._submit(self._pacer.skip, pause_pos * self.newline_delay)
+            self._submit(self._pacer.emit_unit, f'\x1b[{pause_pos + 1}C', self.newline_delay, 'newline')
+            self._pause(delay, 'newline')
+            spaces_left = self.width - pause_pos - 1
+        self._submit(self._pacer.skip, spaces_left * self.newline_delay)
+        self._submit(self._pacer.emit_unit, '\n', self.newline_delay, 'newline')
+
+    def _submit(self, func, *args):
+        if self._render_queue is None:
+            func(*args)
+            return
+        self._raise_render_error()
+        op = (func, args)
+        self._render_stats['ops'] += 1
+        try:
+            self._render_queue.put_nowait(op)
+        except queue.Full:
+            # Backpressure--wait for the render thread to make some room
+            start = self._clock.monotonic()
+            self._render_queue.put(op)
+            self._render_stats['blocked'] += 1
+            self._render_stats['blocked_seconds'] += self._clock.monotonic() - start
+        depth = self._render_queue.qsize()
+        if depth > self._render_stats['high_water']:
+            self._render_stats['high_water'] = depth
+
+    def _render_loop(self):
+        # Runs forever in the render thread.  Once an operation fails, the
+        # rest are thrown away unrun, so the queue keeps emptying and nothing
+        # waits on it forever.  The error is raised on the printing side.
+        while True:
+            func, args = self._render_queue.get()
+            try:
+                if self._render_error is None:
+                    func(*args)
+            except Exception as e:
+                self._render_error = e
+            finally:
+                self._render_queue.task_done()
+
+    def _raise_render_error(self):
+        if self._render_error is not None:
+            raise self._render_error
+
+    # Add a function to be called with every chunk of text as it's written
+    # to the output, from whichever thread is doing the writing
+    def add_listener(self, func):
+        self._listeners.append(func)
+
+    def _write(self, s):
+        self._output.write(s)
+        for listener in self._listeners:
+            listener(s)
+
+    def _clear_now(self):
+        self._output.clear()
+        # Listeners don't see the output's own screen clearing, so send
+        # them the ANSI equivalent
+        for listener in self._listeners:
+            listener('\x1b[H\x1b[2J')
+        self._write('\n' * self.height)
+        self._pacer.reset()
+
+    # Returns a new Output object, given the 'output' display setting
+    def create_output(self, setting):
+        if isinstance(setting, str):
+            setting = {'module': setting}
+        mod_name = setting['module']
+        if mod_name.endswith('.py'):
+            mod_name = mod_name[0:-3]
+        module = importlib.import_module('outputs.' + mod_name)
+        return module.Output(self.height, self.width, setting)
+
 
 ########  Formatting helpers  #################################################
 
@@ -196,63 +483,10 @@ class Display:
     # This also removes returns and strips whitespace at ends
     @classmethod
     def clean_chars(cls, s):
-        new_s = ''
-        for c in s:
-            u = ord(c)
-            # Tab = four spaces
-            if u == 9:
-                new_s += '    '
-                continue
-            # Fancy puncuation and other special characters
-            if u >= 0x2013:
-                # Various dashes
-                if 0x2013 <= u <= 0x2017:
-                    new_s += '-'
-                # Double quotes
-                elif u == 0x201C or u == 0x201D:
-                    new_s += '"'
-                # Single quotes
-                elif u == 0x2018 or u == 0x2019:
-                    new_s += "'"
-                # Bullet
-                elif u == 0x2022:
-                    new_s += "*"
-                # Ellipsis...
-                elif u == 0x2026:
-                    new_s += '...'
-                # Copyright and Reg Trmk
-                elif u == 0x00A9:
-                    new_s += '(c)'
-                elif u == 0x00AE:
-                    new_s += '(R)'
-                # Capital and lowercase tilde-n
-                elif u == 0x00D1:
-                    news_s += 'N'
-                elif u == 0x00F1:
-                    news_s += 'n'
-            # Any old-school ASCII may pass
-            elif (32 <= u <= 126):
-                new_s += c   
-        return new_s.strip()
+        return normalize.clean_chars(s)
     
 
     # Pulls out a few HTML tags
     @classmethod
     def strip_tags(cls, s):
-        s = s.replace('\\u003c', '<')
-        s = s.replace('\\"', '"')
-        s = s.replace('</a>', '')
-        while True:
-            start_pos = s.find('<a')
-            if start_pos < 0:
-                break
-            end_pos = s.find('>', start_pos)
-            if end_pos < 0:
-                break
-            s = s[0:start_pos] + s[end_pos+1:]
-        s = s.replace('<br>', '\n')
-        s = s.replace('<BR>', '\n')
-        return s
-            
-
-
+        return normalize.strip_tags(s)
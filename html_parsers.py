@@ -0,0 +1,133 @@
+################################################################################
+#
+#   HTML Parsers
+#
+#   Builds BeautifulSoup objects for SegmentParent.get_soup(), with a choice
+#   of parser, and optionally only for the parts of the page a segment
+#   actually looks at.  Parsing a whole page into a tree with Python's own
+#   html.parser is about the slowest thing a segment does on a Pi.
+#
+#   Parsers:
+#
+#       html.parser   Python's built-in parser.  Always there.  The default.
+#       lxml          Much faster, if the lxml package is installed
+#       selectolax    Finds the wanted elements with the selectolax package's
+#                     C parser and CSS selectors, then hands just those to
+#                     BeautifulSoup.  Fastest by far, but only useful with a
+#                     filter (see below).
+#       fast          Whichever of the above is fastest and installed
+#
+#   If the parser asked for isn't installed, it's as if 'fast' was asked for.
+#
+#   A filter ('only') is a list of tags to keep, each either a tag name or a
+#   (name, attrs) pair, such as:
+#
+#       ['fin-streamer', ('span', {'data-id':'mk-msg'})]
+#
+#   Only those tags, with everything inside them, end up in the soup.  So
+#   search the soup the same way as always, just don't expect to find
+#   anything else.  (With more than one tag in the filter, html.parser and
+#   lxml go by tag names alone, so there may be a few extra tags of those
+#   names in there as well.)
+#
+#   Optional installs, for the Pi:  pip install lxml selectolax
+#
+#   Used by segment_parent.py.
+#
+################################################################################
+
+import importlib.util
+
+from bs4 import BeautifulSoup, SoupStrainer
+
+
+def is_installed(parser):
+    if parser == 'html.parser':
+        return True
+    if parser == 'lxml':
+        return importlib.util.find_spec('lxml') is not None
+    if parser == 'selectolax':
+        return importlib.util.find_spec('selectolax') is not None
+    return False
+
+
+def choose(parser, only=None):
+    # Returns the parser that will actually be used
+    if parser != 'fast' and is_installed(parser) and (parser != 'selectolax' or only):
+        return parser
+    if only and is_installed('selectolax'):
+        return 'selectolax'
+    if is_installed('lxml'):
+        return 'lxml'
+    return 'html.parser'
+
+
+def normalize_filter(only):
+    # Returns the filter as a tuple of (name, attrs-tuple) pairs, which can
+    # be used as a dictionary key.  None stays None, and a filter that's
+    # already been through here comes back the same.
+    if only is None:
+        return None
+    if isinstance(only, str) or (isinstance(only, tuple) and len(only) == 2 and isinstance(only[1], dict)):
+        only = [only]
+    targets = []
+    for target in only:
+        if isinstance(target, str):
+            targets.append((target, ()))
+        else:
+            name, attrs = target
+            if isinstance(attrs, dict):
+                attrs = attrs.items()
+            targets.append((name, tuple(sorted(attrs))))
+    return tuple(targets)
+
+
+def make_soup(text, parser='html.parser', only=None):
+    # Returns a BeautifulSoup object for the passed page text
+    only = normalize_filter(only)
+    parser = choose(parser, only)
+    if parser == 'selectolax':
+        return _selectolax_soup(text, only)
+    if not only:
+        return BeautifulSoup(text, parser)
+    return BeautifulSoup(text, parser, parse_only=strainer(only))
+
+
+def strainer(only):
+    if len(only) == 1:
+        name, attrs = only[0]
+        return SoupStrainer(name, dict(attrs))
+    return SoupStrainer([name for name, attrs in only])
+
+
+def css_selector(only):
+    selectors = []
+    for name, attrs in only:
+        selector = name
+        for attr, value in attrs:
+            value = str(value).replace('\\', '\\\\').replace('"', '\\"')
+            selector += f'[{attr}="{value}"]'
+        selectors.append(selector)
+    return ', '.join(selectors)
+
+
+def _selectolax_soup(text, only):
+    try:
+        from selectolax.lexbor import LexborHTMLParser as HTMLParser
+    except ImportError:
+        # Versions before 1.0
+        from selectolax.parser import HTMLParser
+    tree = HTMLParser(text)
+    # Matches come back in page order.  Skip any inside an earlier match,
+    # since they come along with it anyway.
+    kept = set()
+    parts = []
+    for node in tree.css(css_selector(only)):
+        parent = node.parent
+        while parent is not None and parent.mem_id not in kept:
+            parent = parent.parent
+        if parent is not None:
+            continue
+        kept.add(node.mem_id)
+        parts.append(node.html)
+    return BeautifulSoup(''.join(parts), choose('lxml'))
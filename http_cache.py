@@ -0,0 +1,196 @@
+################################################################################
+#
+#   HTTP Cache Class
+#
+#   Keeps pages on disk along with their validators (ETag and Last-Modified
+#   headers), so the next request for the same page can ask the server
+#   whether it's changed.  If it hasn't, the server answers "304 Not
+#   Modified" with no body at all, and we use the copy we already have.
+#
+#   - Only responses that came with a validator are stored.  Without one
+#     there's no way to check them later.
+#   - Entries are looked up by whatever key string HttpClient passes as the
+#     url:  the url itself, or for pages only partly read, the url plus how
+#     they were read
+#   - Entries not used or revalidated for max_age seconds are thrown out,
+#     as are the least-recently-used ones once the cache is over max_bytes
+#   - Each entry is a body file plus a small JSON file, both written to a
+#     temporary name first and then renamed, so a power cut never leaves a
+#     half-written entry behind
+#
+#   Used by HttpClient (see http_client.py), which sets it up from the
+#   'cache_dir', 'cache_max_bytes', and 'cache_max_age' http settings.
+#
+################################################################################
+
+import hashlib
+import json
+import os
+import threading
+
+from clock import Clock
+
+
+class HttpCache:
+
+    def __init__(self, directory, max_bytes=50_000_000, max_age=7*24*3600, clock=None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._clock = clock if clock is not None else Clock()
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        # key -> [size in bytes, last used (epoch seconds)], for eviction
+        self._index = {}
+        self._bytes = 0
+        self.evictions = 0
+        self._load_index()
+
+
+    @classmethod
+    def key_for(cls, url):
+        return hashlib.sha1(url.encode('utf-8')).hexdigest()
+
+
+    def _paths(self, key):
+        base = os.path.join(self.directory, key)
+        return (base + '.json', base + '.body')
+
+
+    def _load_index(self):
+        for name in os.listdir(self.directory):
+            if not name.endswith('.json'):
+                continue
+            key = name[:-5]
+            meta_path, body_path = self._paths(key)
+            try:
+                self._index[key] = [os.path.getsize(body_path), os.path.getmtime(meta_path)]
+            except OSError:
+                # Missing its body.  Clean it up.
+                self._remove(key)
+                continue
+            self._bytes += self._index[key][0]
+        self._evict()
+
+
+    def lookup(self, url):
+        # Returns the stored entry's metadata for url (validators, headers,
+        # etc.), or None if we don't have a usable one
+        key = self.key_for(url)
+        with self._lock:
+            if key not in self._index:
+                return None
+            if self._clock.time() - self._index[key][1] > self.max_age:
+                self._remove(key)
+                return None
+            try:
+                with open(self._paths(key)[0]) as f:
+                    meta = json.load(f)
+            except (OSError, ValueError):
+                self._remove(key)
+                return None
+        if meta.get('url') != url:
+            return None
+        return meta
+
+
+    def validators(self, meta):
+        # Returns the conditional request headers for a stored entry
+        headers = {}
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+        return headers
+
+
+    def body(self, url):
+        # Returns the stored body for url, as bytes, or None.  Counts as
+        # having used (and revalidated) the entry.
+        key = self.key_for(url)
+        meta_path, body_path = self._paths(key)
+        with self._lock:
+            try:
+                with open(body_path, 'rb') as f:
+                    content = f.read()
+                os.utime(meta_path)
+            except OSError:
+                self._remove(key)
+                return None
+            if key in self._index:
+                self._index[key][1] = self._clock.time()
+        return content
+
+
+    def store(self, url, response):
+        # Saves a successful requests.Response, if it has validators
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        if response.status_code != 200 or (etag is None and last_modified is None):
+            return
+        key = self.key_for(url)
+        meta = {'url':url,
+                'etag':etag,
+                'last_modified':last_modified,
+                'content_type':response.headers.get('Content-Type'),
+                'encoding':response.encoding,
+                'truncated':getattr(response, 'truncated', False),
+               }
+        content = response.content
+        if len(content) > self.max_bytes:
+            return
+        meta_path, body_path = self._paths(key)
+        with self._lock:
+            try:
+                self._write_file(body_path, content)
+                self._write_file(meta_path, json.dumps(meta).encode('utf-8'))
+            except OSError:
+                self._remove(key)
+                return
+            if key in self._index:
+                self._bytes -= self._index[key][0]
+            self._index[key] = [len(content), self._clock.time()]
+            self._bytes += len(content)
+            self._evict()
+
+
+    @classmethod
+    def _write_file(cls, path, data):
+        temp_path = path + '.tmp'
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, path)
+
+
+    def _evict(self):
+        # Drop expired entries, then least-recently-used ones until we're
+        # under the size limit.  Call with the lock held (or during setup).
+        now = self._clock.time()
+        for key in [k for k, (size, used) in self._index.items() if now - used > self.max_age]:
+            self._remove(key)
+            self.evictions += 1
+        if self._bytes <= self.max_bytes:
+            return
+        for key in sorted(self._index, key=lambda k: self._index[k][1]):
+            if self._bytes <= self.max_bytes:
+                break
+            self._remove(key)
+            self.evictions += 1
+
+
+    def _remove(self, key):
+        if key in self._index:
+            self._bytes -= self._index.pop(key)[0]
+        for path in self._paths(key):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+    def stats(self):
+        with self._lock:
+            return {'items':len(self._index),
+                    'bytes':self._bytes,
+                    'evictions':self.evictions,
+                   }
@@ -0,0 +1,359 @@
+################################################################################
+#
+#   HTTP Client Class
+#
+#   One shared requests.Session for all the segments' fetching, so that:
+#
+#   - Connections are pooled and kept alive, so refreshes from the same site
+#     skip the DNS lookup and TCP/TLS handshakes after the first one
+#   - Every request has connect and read timeouts.  A server that stops
+#     answering costs us a few seconds, not the whole feed.
+#   - Responses come compressed (gzip/deflate, plus Brotli if the brotli
+#     package is installed) and are decompressed for us by requests
+#   - Pages are kept on disk with their ETag/Last-Modified validators, and
+#     re-requested conditionally.  When the server says a page hasn't
+#     changed (304 Not Modified) we get the stored copy back instead, having
+#     downloaded only a few hundred bytes of headers.  See http_cache.py.
+#   - Requests for the same url that overlap share a single request and
+#     response (see single_flight.py)
+#   - Each host has a circuit breaker (see circuit_breaker.py).  After a few
+#     failures in a row, requests to that host are turned away right here,
+#     without being sent, until a backoff time is up.
+#   - Bodies are read in chunks, up to a byte limit, so one huge page can't
+#     eat all the Pi's memory.  A caller can also pass stop markers, and
+#     reading ends as soon as they've all turned up in the (incrementally
+#     decoded) text.  The connection is dropped then, rather than
+#     downloading the rest.  Responses cut short have 'truncated' set.
+#     Pages read with stop markers or a byte limit of the caller's own are
+#     cached apart from the whole page (keyed by url, markers, and limit),
+#     so they get revalidated too.  Then a 304 brings back the same part
+#     of the page we read last time.
+#   - Bytes and time taken are recorded for every request, per host,
+#     including how many bytes we skipped by stopping early (which is only
+#     known when the server sent a Content-Length)
+#
+#   Segments don't use this directly.  They call SegmentParent.fetch() (or
+#   get_soup(), which uses fetch()).
+#
+#   Settings, from the 'http' table of the config (all optional):
+#
+#       connect_timeout   Seconds to wait for a connection (default = 5)
+#       read_timeout      Seconds to wait for the server to send something
+#                         (default = 20)
+#       pool_size         Connections kept open per host (default = 4)
+#       user_agent        User-Agent header (default = 'RetroFeed')
+#       cache_dir         Directory for the page cache (default = 'http_cache'
+#                         in the RetroFeed directory).  None turns it off.
+#       cache_max_bytes   Size limit for the cache (default = 50,000,000)
+#       cache_max_age     Seconds an unused page stays in the cache
+#                         (default = 604,800, one week)
+#       breaker_failures  Failures in a row before a host's circuit breaker
+#                         opens (default = 3)
+#       breaker_backoff   Seconds the breaker first stays open (default = 30).
+#                         Doubles each time it reopens.
+#       breaker_max_backoff
+#                         Longest the breaker stays open (default = 900)
+#       breaker_slow_seconds
+#                         Responses taking longer than this count as failures
+#                         too (default = None, meaning they don't)
+#       max_bytes         Most bytes of any one response body to read, after
+#                         decompression (default = 8,000,000).  Callers can
+#                         set their own limit per request.
+#
+################################################################################
+
+import codecs
+import collections
+import importlib.util
+import json
+import os
+import threading
+import urllib.parse
+
+import requests
+import requests.adapters
+import requests.structures
+
+from circuit_breaker import CircuitBreaker
+from clock import Clock
+from http_cache import HttpCache
+from single_flight import SingleFlight
+
+
+class HttpClient:
+
+    # How many recent requests to remember for stats()
+    RECENT = 50
+
+    # Bytes per read of a response body
+    CHUNK_SIZE = 16384
+
+    def __init__(self, settings=None, clock=None):
+        if settings is None:
+            settings = {}
+        self._clock = clock if clock is not None else Clock()
+        self.timeout = (settings.get('connect_timeout', 5), settings.get('read_timeout', 20))
+        self.max_bytes = settings.get('max_bytes', 8_000_000)
+        pool_size = settings.get('pool_size', 4)
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        encodings = 'gzip, deflate'
+        if importlib.util.find_spec('brotli') is not None or importlib.util.find_spec('brotlicffi') is not None:
+            encodings += ', br'
+        self.session.headers.update({'Accept-Encoding': encodings,
+                                     'User-Agent': settings.get('user_agent', 'RetroFeed'),
+                                    })
+        default_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'http_cache')
+        cache_dir = settings.get('cache_dir', default_dir)
+        self.cache = None
+        if cache_dir is not None:
+            self.cache = HttpCache(cache_dir,
+                                   settings.get('cache_max_bytes', 50_000_000),
+                                   settings.get('cache_max_age', 7*24*3600),
+                                   self._clock)
+        self._flights = SingleFlight()
+        self._breaker_settings = {'failures':settings.get('breaker_failures', 3),
+                                  'backoff':settings.get('breaker_backoff', 30),
+                                  'max_backoff':settings.get('breaker_max_backoff', 900),
+                                  'slow_seconds':settings.get('breaker_slow_seconds', None),
+                                 }
+        self._breakers = {}
+        self._lock = threading.Lock()
+        self._hosts = {}
+        self._recent = collections.deque(maxlen=self.RECENT)
+
+
+    def fetch(self, url, headers=None, max_bytes=None, stop=None):
+        # Returns the requests.Response for url, whatever its status code, or
+        # None if the request failed outright (timeout, no connection, etc.)
+        # At most max_bytes of the body are read (default from settings).  If
+        # 'stop' is a string, or a list of strings, reading also ends once
+        # they've all been found, in that order.  Either way, the response
+        # will have 'truncated' set to True if the body got cut short.
+        # If the server says our cached copy is still good, the response is
+        # made from that copy, with status 200 and 'not_modified' set to True.
+        # If the same request is already under way, waits for it and returns
+        # its response instead.  Also returns None, right away, if the host's
+        # circuit breaker is open.
+        if isinstance(stop, str):
+            stop = [stop]
+        if stop is not None:
+            stop = tuple(stop)
+        key = (url, tuple(sorted((headers or {}).items())), max_bytes, stop)
+        return self._flights.do(key, self._fetch, url, headers, max_bytes, stop)
+
+
+    def breaker(self, host):
+        # Returns the CircuitBreaker for host, creating it if need be
+        with self._lock:
+            if host not in self._breakers:
+                self._breakers[host] = CircuitBreaker(**self._breaker_settings, clock=self._clock)
+            return self._breakers[host]
+
+
+    @classmethod
+    def cache_key(cls, url, max_bytes, stop):
+        # Partial reads are cached separately from the whole page, and from
+        # partial reads with different limits
+        if max_bytes is None and stop is None:
+            return url
+        return url + ' ' + json.dumps({'max_bytes':max_bytes, 'stop':stop})
+
+
+    def _fetch(self, url, headers, max_bytes, stop):
+        breaker = self.breaker(urllib.parse.urlsplit(url).netloc)
+        token = breaker.allow()
+        if token is None:
+            return None
+        cache_key = self.cache_key(url, max_bytes, stop)
+        cached = self.cache.lookup(cache_key) if self.cache is not None else None
+        if cached is not None:
+            headers = dict(headers or {}, **self.cache.validators(cached))
+        start = self._clock.monotonic()
+        status = None
+        try:
+            response = self.session.get(url, headers=headers, timeout=self.timeout, stream=True)
+            # Read the body now, so the time taken includes it
+            self._read_body(response, max_bytes if max_bytes is not None else self.max_bytes, stop)
+            status = response.status_code
+        except requests.RequestException as e:
+            self._record(url, None, 0, 0, 0, self._clock.monotonic() - start, repr(e))
+            return None
+        finally:
+            breaker.record(token, status, self._clock.monotonic() - start)
+        size = len(response.content)
+        wire_size = self._wire_size(response, size)
+        # How much we didn't download.  Unknown (None) without a
+        # Content-Length, as with chunked responses.
+        saved = 0
+        if response.truncated:
+            length = response.headers.get('Content-Length', '')
+            saved = max(0, int(length) - wire_size) if length.isdigit() else None
+        self._record(url, response.status_code, size, wire_size, saved, self._clock.monotonic() - start,
+                     truncated=response.truncated)
+        response.not_modified = False
+        if response.status_code == 304 and cached is not None:
+            body = self.cache.body(cache_key)
+            if body is not None:
+                return self._from_cache(url, cached, body, response)
+        # A page cut short by the default limit alone is too big to cache
+        if self.cache is not None and response.status_code == 200 \
+           and not (response.truncated and cache_key == url):
+            self.cache.store(cache_key, response)
+        return response
+
+
+    @classmethod
+    def _read_body(cls, response, max_bytes, stop):
+        # Reads the streamed body into response.content, a chunk at a time,
+        # until it ends, max_bytes have been read, or the stop markers have
+        # all been seen.  Sets response.truncated accordingly, and
+        # response.received to the bytes actually pulled in, kept or not.
+        chunks = []
+        size = 0
+        response.truncated = False
+        response.received = 0
+        scanner = None
+        if stop:
+            scanner = _StopScanner(stop, response.encoding or 'utf-8')
+        try:
+            for chunk in response.iter_content(cls.CHUNK_SIZE):
+                response.received += len(chunk)
+                if size + len(chunk) > max_bytes:
+                    chunks.append(chunk[:max_bytes - size])
+                    response.truncated = True
+                    break
+                chunks.append(chunk)
+                size += len(chunk)
+                if scanner is not None and scanner.feed(chunk):
+                    response.truncated = True
+                    break
+        finally:
+            if response.truncated:
+                # Don't put a half-read connection back in the pool
+                response.close()
+        response._content = b''.join(chunks)
+        response._content_consumed = True
+
+
+    @classmethod
+    def _wire_size(cls, response, size):
+        # Bytes actually received, before decompression.  urllib3 only
+        # knows that for a plain body, and says 0 for a chunked one.  Then
+        # the best there is is what _read_body() pulled in, which is after
+        # decompression.
+        try:
+            wire_size = response.raw.tell()
+        except Exception:
+            wire_size = 0
+        if wire_size > 0:
+            return wire_size
+        return getattr(response, 'received', size)
+
+
+    @classmethod
+    def _from_cache(cls, url, meta, body, not_modified):
+        # Build a regular-looking response out of a cache entry
+        response = requests.Response()
+        response.status_code = 200
+        response.url = url
+        response.headers = requests.structures.CaseInsensitiveDict(not_modified.headers)
+        if meta.get('content_type'):
+            response.headers['Content-Type'] = meta['content_type']
+        response.encoding = meta.get('encoding')
+        response._content = body
+        response.not_modified = True
+        response.truncated = meta.get('truncated', False)
+        return response
+
+
+    def _record(self, url, status, size, wire_size, saved, seconds, error=None, truncated=False):
+        host = urllib.parse.urlsplit(url).netloc
+        with self._lock:
+            stats = self._hosts.setdefault(host, {'requests':0, 'errors':0, 'not_modified':0,
+                                                  'truncated':0, 'truncated_unknown':0,
+                                                  'bytes':0, 'wire_bytes':0,
+                                                  'bytes_saved':0, 'seconds':0.0})
+            stats['requests'] += 1
+            if status == 304:
+                stats['not_modified'] += 1
+            if error is not None or status >= 400:
+                stats['errors'] += 1
+            if truncated:
+                stats['truncated'] += 1
+                if saved is None:
+                    stats['truncated_unknown'] += 1
+            stats['bytes'] += size
+            stats['wire_bytes'] += wire_size
+            stats['bytes_saved'] += saved or 0
+            stats['seconds'] += seconds
+            self._recent.append({'url':url,
+                                 'status':status,
+                                 'bytes':size,
+                                 'wire_bytes':wire_size,
+                                 'bytes_saved':saved,
+                                 'seconds':round(seconds, 3),
+                                 'error':error,
+                                })
+
+
+    def stats(self):
+        # Returns totals per host, plus the most recent requests, how many
+        # requests were shared, each host's circuit breaker, and the cache's
+        # size.  'bytes' are after decompression, 'wire_bytes' as sent.
+        # 'bytes_saved' is what wasn't downloaded thanks to stopping early,
+        # going by the Content-Length.  Responses without one (chunked) are
+        # counted in 'truncated_unknown' instead, and have a 'bytes_saved'
+        # of None in 'recent'.
+        with self._lock:
+            stats = {'hosts':{host:dict(s) for host, s in self._hosts.items()},
+                     'recent':list(self._recent),
+                    }
+        stats['single_flight'] = self._flights.stats()
+        with self._lock:
+            breakers = dict(self._breakers)
+        stats['breakers'] = {host:b.stats() for host, b in breakers.items()}
+        if self.cache is not None:
+            stats['cache'] = self.cache.stats()
+        return stats
+
+
+    def close(self):
+        self.session.close()
+
+
+
+class _StopScanner:
+
+    # Looks for a series of marker strings, in order, in text that arrives a
+    # chunk of bytes at a time, keeping only enough text around to catch a
+    # marker split across two chunks
+
+    def __init__(self, markers, encoding):
+        self.markers = markers
+        self.found = 0
+        self.tail = ''
+        try:
+            self.decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+        except LookupError:
+            self.decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+
+
+    def feed(self, chunk):
+        # Returns True once every marker has been found
+        text = self.tail + self.decoder.decode(chunk)
+        pos = 0
+        while self.found < len(self.markers):
+            marker = self.markers[self.found]
+            at = text.find(marker, pos)
+            if at < 0:
+                break
+            pos = at + len(marker)
+            self.found += 1
+        if self.found == len(self.markers):
+            return True
+        keep = len(self.markers[self.found]) - 1
+        self.tail = text[max(pos, len(text) - keep):] if keep > 0 else ''
+        return False
@@ -0,0 +1,77 @@
+################################################################################
+#
+#   Layout Cache Class
+#
+#   - Remembers the finished layout (wrapped, and uppercased if configured)
+#     of strings the Display has printed, so the same news summaries, On This
+#     Day items, etc. don't get wrapped all over again every playlist cycle
+#   - Least-recently-used entries are thrown out once either the item limit
+#     or the (approximate) memory limit is reached, since the feed may run
+#     for months without a restart
+#
+#   Used by the Display class.
+#
+################################################################################
+
+import collections
+
+
+class LayoutCache:
+
+    def __init__(self, max_items=512, max_bytes=1_000_000):
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self._entries = collections.OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+
+    @classmethod
+    def entry_size(cls, key, lines):
+        # Rough memory cost of an entry, in bytes:  the key's text, the
+        # lines, and some overhead for the objects holding them
+        return len(key[0]) + sum(len(line) for line in lines) + 64 * (len(lines) + 2)
+
+
+    def get(self, key):
+        # Returns the cached lines for key, or None
+        lines = self._entries.get(key)
+        if lines is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return lines
+
+
+    def put(self, key, lines):
+        size = self.entry_size(key, lines)
+        if size > self.max_bytes:
+            # Too big to bother with
+            return
+        if key in self._entries:
+            self._bytes -= self.entry_size(key, self._entries.pop(key))
+        self._entries[key] = lines
+        self._bytes += size
+        while len(self._entries) > self.max_items or self._bytes > self.max_bytes:
+            old_key, old_lines = self._entries.popitem(last=False)
+            self._bytes -= self.entry_size(old_key, old_lines)
+            self.evictions += 1
+
+
+    def clear(self):
+        self._entries.clear()
+        self._bytes = 0
+
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {'items':len(self._entries),
+                'bytes':self._bytes,
+                'hits':self.hits,
+                'misses':self.misses,
+                'evictions':self.evictions,
+                'hit_rate':self.hits / lookups if lookups > 0 else 0.0,
+               }
@@ -0,0 +1,268 @@
+################################################################################
+#
+#   Mirror Server
+#
+#   Serves the feed from one Display to any number of network viewers, so a
+#   whole building full of screens only needs one RetroFeed process (and the
+#   websites being scraped only see one visitor).
+#
+#   - Telnet:  Connect with any telnet client (or netcat) to the telnet port
+#              and the feed just scrolls by
+#   - HTTP:    Browse to the HTTP port for a bare-bones viewer page, which
+#              gets the feed as Server-Sent Events from /events
+#
+#   Everything runs on an asyncio event loop in its own thread.  The Display
+#   just hands over each chunk of text as it goes out, which only costs a
+#   thread-safe callback.  Every viewer has its own bounded buffer, so a slow
+#   or stalled connection never holds up the display or the other viewers.
+#   If a viewer falls too far behind, it's either dropped or skipped ahead to
+#   the live feed, depending on the 'slow_clients' setting.
+#
+#   Configured with the 'mirror' display setting, a dictionary with:
+#
+#       host            Address to listen on (default = '0.0.0.0')
+#       telnet_port     Port for telnet viewers (default = 2323, None to
+#                       disable)
+#       http_port       Port for web viewers (default = 8023, None to disable)
+#       client_buffer   Maximum bytes waiting to go out to any one viewer
+#                       (default = 65536)
+#       slow_clients    'drop' or 'skip' (default = 'skip')
+#
+#   If a port can't be listened on (already in use, say), creating the
+#   MirrorServer raises the OSError, rather than the feed carrying on without
+#   a mirror nobody can connect to.
+#
+################################################################################
+
+import asyncio
+import collections
+import json
+import threading
+
+
+VIEWER_PAGE = '''<!DOCTYPE html>
+<html><head><title>RetroFeed</title>
+<style>body{background:#000;margin:0}pre{color:#fff;font:16px monospace;margin:1em}</style>
+</head><body><pre id="screen"></pre><script>
+var rows = [''], maxRows = %d, screen = document.getElementById('screen');
+new EventSource('/events').onmessage = function(e) {
+  var s = JSON.parse(e.data).replace(/\\x1b\\[(\\d*)C/g, function(m, n) { return ' '.repeat(n || 1); })
+                             .replace(/\\x1b\\[[0-9;]*[@-~]/g, '').replace(/\\r/g, '');
+  var lines = s.split('\\n');
+  rows[rows.length - 1] += lines[0];
+  for (var i = 1; i < lines.length; i++) rows.push(lines[i]);
+  if (rows.length > maxRows) rows = rows.slice(rows.length - maxRows);
+  screen.textContent = rows.join('\\n');
+};
+</script></body></html>
+'''
+
+
+
+class Viewer:
+
+    # One connected client, and the bytes waiting to go out to it
+
+    def __init__(self, writer, kind, limit):
+        self.writer = writer
+        self.kind = kind
+        self.limit = limit
+        self.pending = collections.deque()
+        self.pending_bytes = 0
+        self.ready = asyncio.Event()
+        self.closed = False
+
+
+    def push(self, b):
+        # Returns False if there's no room for b
+        if self.pending_bytes + len(b) > self.limit:
+            return False
+        self.pending.append(b)
+        self.pending_bytes += len(b)
+        self.ready.set()
+        return True
+
+
+    def take(self):
+        b = b''.join(self.pending)
+        self.pending.clear()
+        self.pending_bytes = 0
+        self.ready.clear()
+        return b
+
+
+
+class MirrorServer:
+
+    # Most seconds to wait for the servers to start listening
+    START_TIMEOUT = 10
+
+    def __init__(self, settings, height=24, width=40):
+        self.host = settings.get('host', '0.0.0.0')
+        self.telnet_port = settings.get('telnet_port', 2323)
+        self.http_port = settings.get('http_port', 8023)
+        self.client_buffer = settings.get('client_buffer', 65536)
+        self.slow_clients = settings.get('slow_clients', 'skip')
+        self.height = height
+        # Recent output, so new viewers start with a screenful of text
+        # rather than a blank screen
+        self._history = collections.deque()
+        self._history_len = 0
+        self._history_limit = height * width * 2
+        self._viewers = set()
+        self._stats = {'connections':0, 'dropped':0, 'skipped':0, 'bytes_sent':0}
+        # Start the event loop in its own thread and wait for the servers to
+        # be listening before carrying on
+        self._loop = asyncio.new_event_loop()
+        self._started = threading.Event()
+        self._telnet_server = None
+        self._http_server = None
+        self._start_error = None
+        threading.Thread(target=self._run, name='mirror', daemon=True).start()
+        if not self._started.wait(self.START_TIMEOUT):
+            self.close()
+            raise RuntimeError('Mirror server did not start listening in time')
+        if self._start_error is not None:
+            raise self._start_error
+
+
+    def _run(self):
+        asyncio.set_event_loop(self._loop)
+        try:
+            if self.telnet_port is not None:
+                self._telnet_server = self._loop.run_until_complete(
+                    asyncio.start_server(self._telnet_client, self.host, self.telnet_port))
+            if self.http_port is not None:
+                self._http_server = self._loop.run_until_complete(
+                    asyncio.start_server(self._http_client, self.host, self.http_port))
+        except Exception as e:
+            # Handed to __init__() to raise
+            self._start_error = e
+            for server in (self._telnet_server, self._http_server):
+                if server is not None:
+                    server.close()
+            self._loop.close()
+            return
+        finally:
+            self._started.set()
+        self._loop.run_forever()
+
+
+    @property
+    def ports(self):
+        # Actual (telnet, http) ports being listened on, which is mostly
+        # useful when they were configured as 0 to pick any free port
+        return tuple(None if server is None else server.sockets[0].getsockname()[1]
+                     for server in (self._telnet_server, self._http_server))
+
+
+    def stats(self):
+        stats = dict(self._stats)
+        stats['viewers'] = len(self._viewers)
+        return stats
+
+
+    def publish(self, s):
+        # Called by the Display, from whatever thread is doing the output
+        self._loop.call_soon_threadsafe(self._broadcast, s)
+
+
+    def close(self):
+        def shut_down():
+            for server in (self._telnet_server, self._http_server):
+                if server is not None:
+                    server.close()
+            for viewer in list(self._viewers):
+                viewer.writer.close()
+            self._loop.stop()
+        self._loop.call_soon_threadsafe(shut_down)
+
+
+########  Event loop side  ####################################################
+
+    @classmethod
+    def encode(cls, s, kind):
+        if kind == 'telnet':
+            return s.replace('\n', '\r\n').encode('ascii', errors='replace')
+        return b'data: ' + json.dumps(s).encode('ascii') + b'\n\n'
+
+
+    def _broadcast(self, s):
+        self._history.append(s)
+        self._history_len += len(s)
+        while self._history_len > self._history_limit:
+            self._history_len -= len(self._history.popleft())
+        encoded = {}
+        for viewer in list(self._viewers):
+            if viewer.kind not in encoded:
+                encoded[viewer.kind] = self.encode(s, viewer.kind)
+            if viewer.push(encoded[viewer.kind]):
+                continue
+            # This viewer can't keep up
+            if self.slow_clients == 'drop':
+                self._stats['dropped'] += 1
+                self._forget(viewer)
+                viewer.writer.close()
+            else:
+                self._stats['skipped'] += 1
+                viewer.take()
+                viewer.push(self.encode('\n[...]\n', viewer.kind))
+
+
+    def _forget(self, viewer):
+        viewer.closed = True
+        viewer.ready.set()
+        self._viewers.discard(viewer)
+
+
+    async def _serve(self, viewer):
+        # Keep sending this viewer whatever's pending until it goes away
+        self._stats['connections'] += 1
+        self._viewers.add(viewer)
+        viewer.push(self.encode(''.join(self._history), viewer.kind))
+        try:
+            while not viewer.closed:
+                await viewer.ready.wait()
+                b = viewer.take()
+                if len(b) > 0:
+                    viewer.writer.write(b)
+                    await viewer.writer.drain()
+                    self._stats['bytes_sent'] += len(b)
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            self._forget(viewer)
+            viewer.writer.close()
+
+
+    async def _telnet_client(self, reader, writer):
+        await self._serve(Viewer(writer, 'telnet', self.client_buffer))
+
+
+    async def _http_client(self, reader, writer):
+        try:
+            request_line = await reader.readline()
+            # Skip the rest of the request headers
+            while (await reader.readline()).strip():
+                pass
+        except (ConnectionError, OSError):
+            writer.close()
+            return
+        parts = request_line.decode('latin-1').split()
+        path = parts[1] if len(parts) > 1 else '/'
+        if path == '/events':
+            writer.write(b'HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\n'
+                         b'Cache-Control: no-cache\r\nConnection: keep-alive\r\n\r\n')
+            await self._serve(Viewer(writer, 'sse', self.client_buffer))
+            return
+        if path == '/':
+            body = (VIEWER_PAGE % self.height).encode('ascii')
+            writer.write(b'HTTP/1.1 200 OK\r\nContent-Type: text/html\r\n'
+                         + f'Content-Length: {len(body)}\r\nConnection: close\r\n\r\n'.encode('ascii') + body)
+        else:
+            writer.write(b'HTTP/1.1 404 Not Found\r\nContent-Length: 0\r\nConnection: close\r\n\r\n')
+        try:
+            await writer.drain()
+        except (ConnectionError, OSError):
+            pass
+        writer.close()
@@ -0,0 +1,127 @@
+################################################################################
+#
+#   Text Normalization
+#
+#   Fast versions of the text cleanup that every scraped headline, summary,
+#   and sighting goes through before display:
+#
+#     clean_chars():  Turns text into plain, printable ASCII.  Fancy quotes,
+#                     dashes, ellipses, and so on become their ASCII lookalikes,
+#                     accented letters lose their accents, tabs become four
+#                     spaces, and anything else (including returns) is dropped.
+#                     Whitespace is stripped from the ends.
+#
+#     strip_tags():   Removes link tags and turns <br> into a return, in a
+#                     single pass over the string.
+#
+#   The Unicode-to-ASCII translation table is built once, at import, so the
+#   per-string work is all done by str.translate() and friends in C.
+#
+#   The Display class's clean_chars() and strip_tags() methods use these.
+#
+################################################################################
+
+import re
+import unicodedata
+
+
+# Characters with specific ASCII substitutes.  Anything not listed here gets
+# a chance to decompose into ASCII (e.g., an accented letter into the plain
+# letter and an accent, which is then dropped) before being given up on.
+SUBSTITUTES = {'\t':'    ',
+               '©':'(c)',    # Copyright
+               '®':'(R)',    # Registered trademark
+               '«':'"',      # Double angle quotes
+               '»':'"',
+               '‐':'-',      # Hyphens
+               '‑':'-',
+               '‒':'-',      # Figure dash
+               '–':'-',      # En dash
+               '—':'-',      # Em dash
+               '―':'-',      # Horizontal bar
+               '‖':'-',
+               '‗':'-',
+               '‘':"'",      # Single quotes
+               '’':"'",
+               '‚':"'",
+               '‛':"'",
+               '“':'"',      # Double quotes
+               '”':'"',
+               '„':'"',
+               '‟':'"',
+               '•':'*',      # Bullet
+               '…':'...',    # Ellipsis
+               '′':"'",      # Prime and double prime
+               '″':'"',
+               '⁄':'/',      # Fraction slash
+               '™':'(TM)',   # Trademark
+               '−':'-',      # Minus sign
+              }
+
+# Covers Latin-1, the various Latin extensions, Greek/Cyrillic, and all the
+# general punctuation and letterlike symbols.  Anything past this that's
+# still not ASCII after translation is simply dropped.
+TABLE_LIMIT = 0x2200
+
+
+
+def _ascii_for(c):
+    # Returns the ASCII replacement for character c, or None to drop it
+    if c in SUBSTITUTES:
+        return SUBSTITUTES[c]
+    if ' ' <= c <= '~':
+        return c
+    if ord(c) < 0x80:
+        # Control characters
+        return None
+    replacement = ''
+    for part in unicodedata.normalize('NFKD', c):
+        if unicodedata.combining(part):
+            continue
+        if part in SUBSTITUTES:
+            replacement += SUBSTITUTES[part]
+        elif ' ' <= part <= '~':
+            replacement += part
+        else:
+            return None
+    return replacement if replacement != '' else None
+
+
+
+def build_table():
+    # Returns a tuple, indexed by code point, giving the replacement string
+    # (or None, to delete it) for every character below TABLE_LIMIT.  Lookups
+    # in a tuple are quite a bit quicker for str.translate() than in a dict.
+    return tuple(_ascii_for(chr(u)) for u in range(TABLE_LIMIT))
+
+
+ASCII_TABLE = build_table()
+
+# Everything strip_tags() removes or replaces, in one pattern
+TAG_PATTERN = re.compile(r'</a>|<a[^>]*>|<br>|<BR>')
+
+
+
+def clean_chars(s):
+    # Nothing to translate in plain ASCII text without tabs or other
+    # control characters, which is most of it
+    if s.isascii() and s.isprintable():
+        return s.strip()
+    s = s.translate(ASCII_TABLE)
+    if not s.isascii():
+        s = s.encode('ascii', errors='ignore').decode('ascii')
+    return s.strip()
+
+
+
+def _tag_replacement(match):
+    tag = match.group()
+    return '\n' if tag == '<br>' or tag == '<BR>' else ''
+
+
+
+def strip_tags(s):
+    # Unescape the couple of JSON-escaped bits we see in scraped source first
+    s = s.replace('\\u003c', '<')
+    s = s.replace('\\"', '"')
+    return TAG_PATTERN.sub(_tag_replacement, s)
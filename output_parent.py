@@ -0,0 +1,80 @@
+################################################################################
+#
+#   Output Parent Class
+#
+#   All Output classes (found in the "outputs" directory) should inherit from
+#   this parent class.  An Output is where the Display object sends its
+#   characters once the pacer says it's time:  the console, an in-memory
+#   screen, etc.
+#
+#   Each output module must have a class named "Output", which is created by
+#   the Display object using the 'output' display setting.  The setting can be
+#   just a module name, or a dictionary with a 'module' key and any other
+#   initialization parameters the output needs.
+#
+#     __init__():     Takes the display height and width, and a dictionary of
+#                     initialization parameters (possibly empty)
+#                     Call as super().__init__(height, width, init)
+#
+#     write():        Sends a string to the output.  Required.
+#
+#     clear():        Clears the screen.  Optional.
+#
+#     supports_ansi(): Returns whether the output understands basic ANSI
+#                     cursor movement sequences.  Optional (default False).
+#
+#     backlog():      Returns how many bytes have been written but not yet
+#                     shown, or None if the output can't tell.  Optional
+#                     (default None).  Used for the 'backlog_pacing' setting.
+#
+#     close():        Releases any resources.  Optional.
+#
+################################################################################
+
+
+from abc import ABC, abstractmethod
+
+
+
+class OutputParent(ABC):
+
+    # Outputs that should be written to as fast as possible, with no pacing
+    # delays at all, can set this to False
+    paced = True
+
+    # Outputs whose own line speed sets the character rate (a serial port,
+    # for instance) can set this to True.  The Display then skips its
+    # per-character delays, but beats and pauses still apply.
+    line_paced = False
+
+    def __init__(self, height, width, init):
+        self.height = height
+        self.width = width
+
+
+    @abstractmethod
+    def write(self, s):
+        # Send string s to the output, all at once.  The pacer has already
+        # decided that now is the time, so don't dawdle.
+        pass
+
+
+    def clear(self):
+        # Clear the screen, if that means anything for this output
+        pass
+
+
+    def supports_ansi(self):
+        # Whether we can send ANSI cursor-movement escape sequences
+        return False
+
+
+    def backlog(self):
+        # Bytes still waiting to be shown (in the kernel's tty queue, say),
+        # or None if we have no way of knowing
+        return None
+
+
+    def close(self):
+        # Clean up, if needed
+        pass
@@ -0,0 +1,298 @@
+################################################################################
+#
+#   Framebuffer
+#
+#   Draws the feed directly into a memory-mapped Linux framebuffer, skipping
+#   the kernel's console text path entirely.
+#
+#   Every character the font can draw is rasterized once, at startup, into a
+#   glyph atlas of ready-to-copy pixel rows in the framebuffer's own pixel
+#   format.  Drawing a character is then just a handful of slice copies, and
+#   scrolling the screen is a single memmove of the pixel buffer.
+#
+#   Text handling (wrapping, scrolling, cursor sequences, snapshots) is the
+#   same as the screen_buffer output, which this builds on.
+#
+#   - Initialization parameters:
+#
+#       device          Framebuffer device (default = /dev/fb0).  Any plain
+#                       file can be used instead, which is handy for testing.
+#                       For /dev/fbN devices, the visible size and pixel
+#                       format are asked of the device itself (or read from
+#                       /sys/class/graphics/fbN, if it won't say), and the
+#                       length of a pixel row from sysfs.
+#       fb_width        Framebuffer size in pixels and bits per pixel (16 or
+#       fb_height       32), used only when the device is a plain file.
+#       bits_per_pixel  Defaults are 320 x 336 at 16 bits, to match the
+#                       config.md example.
+#       font            Path to a PSF console font, such as one of the files
+#                       in /usr/share/consolefonts (gzipped is fine).  If
+#                       omitted, a built-in 5x7 font in an 8x8 cell is used.
+#       scale           Whole-number pixel scaling for each glyph (default 1)
+#       foreground      Text and background colors, as '#rrggbb' strings
+#       background      (defaults = '#ffffff' and '#000000')
+#
+#   The text area (display height x width, times the font's cell size) is
+#   centered in the framebuffer and must fit inside it.
+#
+################################################################################
+
+import fcntl
+import gzip
+import mmap
+import os
+import struct
+from outputs.screen_buffer import Output as ScreenBuffer
+
+
+# Built-in 5x7 font for ASCII 32 through 126, in order.  Each glyph is seven
+# rows of five pixels, given as two hex digits per row.
+BUILTIN_FONT = '''
+00000000000000 04040404000004 0a0a0a00000000 0a0a1f0a1f0a0a 040f140e051e04
+18190204081303 0c12140815120d 0c040800000000 02040808080402 08040202020408
+0004150e150400 0004041f040400 000000000c0408 0000001f000000 00000000000c0c
+00010204081000 0e11131519110e 040c040404040e 0e11010204081f 1f02040201110e
+02060a121f0202 1f101e0101110e 0608101e11110e 1f010204080808 0e11110e11110e
+0e11110f01020c 000c0c000c0c00 000c0c000c0408 02040810080402 00001f001f0000
+08040201020408 0e110102040004 0e11010d15150e 0e1111111f1111 1e11111e11111e
+0e11101010110e 1c12111111121c 1f10101e10101f 1f10101e101010 0e11101711110f
+1111111f111111 0e04040404040e 0702020202120c 11121418141211 1010101010101f
+111b1515111111 11111915131111 0e11111111110e 1e11111e101010 0e11111115120d
+1e11111e141211 0f10100e01011e 1f040404040404 1111111111110e 11111111110a04
+1111111515150a 11110a040a1111 1111110a040404 1f01020408101f 0e08080808080e
+00100804020100 0e02020202020e 040a1100000000 0000000000001f 08040200000000
+00000e010f110f 1010161911111e 00000e1010110e 01010d1311110f 00000e111f100e
+0609081c080808 000f11110f010e 10101619111111 04000c0404040e 0200060202120c
+10101214181412 0c04040404040e 00001a15151111 00001619111111 00000e1111110e
+00001e111e1010 00000d130f0101 00001619101010 00000e100e011e 08081c08080906
+0000111111130d 00001111110a04 0000111115150a 0000110a040a11 000011110f010e
+00001f0204081f 02040408040402 04040404040404 08040402040408 00000815020000
+'''
+
+
+
+class Output(ScreenBuffer):
+
+    # Where the kernel describes each framebuffer device
+    SYSFS = '/sys/class/graphics'
+
+    # ioctl for a framebuffer's struct fb_var_screeninfo, which starts with
+    # xres, yres, xres_virtual, yres_virtual, xoffset, yoffset, and
+    # bits_per_pixel, all 32-bit
+    FBIOGET_VSCREENINFO = 0x4600
+
+    def __init__(self, height, width, init):
+        self.device = init.get('device', '/dev/fb0')
+        self.scale = max(int(init.get('scale', 1)), 1)
+        self._fb = None
+        self._read_geometry(init)
+        fg = self.pixel(init.get('foreground', '#ffffff'))
+        bg = self.pixel(init.get('background', '#000000'))
+        self._blank_pixel = bg
+        # Load the font and build the atlas
+        font_path = init.get('font', None)
+        if font_path is None:
+            cell_w, cell_h, glyphs = self.builtin_font()
+        else:
+            cell_w, cell_h, glyphs = self.load_psf(font_path)
+        self.cell_w = cell_w * self.scale
+        self.cell_h = cell_h * self.scale
+        self._atlas = self.build_atlas(cell_w, cell_h, glyphs, fg, bg)
+        # Center the text area, making sure it fits
+        area_w = width * self.cell_w
+        area_h = height * self.cell_h
+        if area_w > self.fb_width or area_h > self.fb_height:
+            raise ValueError(f'{height}x{width} text at {self.cell_w}x{self.cell_h} pixels per character '
+                             f'needs a {area_w}x{area_h} framebuffer, but it is only {self.fb_width}x{self.fb_height}')
+        self.origin_x = (self.fb_width - area_w) // 2
+        self.origin_y = (self.fb_height - area_h) // 2
+        self._map_framebuffer()
+        init = dict(init)
+        init.setdefault('paced', True)
+        init.setdefault('scrollback', 0)
+        super().__init__(height, width, init)
+
+
+########  Setup  ##############################################################
+
+    def _read_geometry(self, init):
+        # Get framebuffer size and format from the device and sysfs if this
+        # is a real framebuffer device, or from the init parameters if not.
+        # The virtual size can be bigger than the screen (for panning or
+        # double buffering), so it's only any use for the row length.
+        name = os.path.basename(self.device)
+        sysfs = f'{self.SYSFS}/{name}'
+        if name.startswith('fb') and os.path.isdir(sysfs):
+            screen_info = self._screen_info()
+            if screen_info is not None:
+                self.fb_width, self.fb_height, self.bits_per_pixel = screen_info
+            else:
+                self.fb_width, self.fb_height = self._sysfs_mode(sysfs)
+                with open(f'{sysfs}/bits_per_pixel') as f:
+                    self.bits_per_pixel = int(f.read())
+            if os.path.exists(f'{sysfs}/stride'):
+                with open(f'{sysfs}/stride') as f:
+                    self.stride = int(f.read())
+            else:
+                with open(f'{sysfs}/virtual_size') as f:
+                    virtual_width = int(f.read().split(',')[0])
+                self.stride = virtual_width * self.bits_per_pixel // 8
+        else:
+            self.fb_width = init.get('fb_width', 320)
+            self.fb_height = init.get('fb_height', 336)
+            self.bits_per_pixel = init.get('bits_per_pixel', 16)
+            self.stride = self.fb_width * self.bits_per_pixel // 8
+        if self.bits_per_pixel not in (16, 32):
+            raise ValueError(f'Unsupported framebuffer depth: {self.bits_per_pixel} bits per pixel')
+        self.bytes_per_pixel = self.bits_per_pixel // 8
+
+
+    def _screen_info(self):
+        # Returns the visible (width, height, bits per pixel), straight from
+        # the device, or None if it won't say
+        try:
+            with open(self.device, 'rb') as f:
+                info = fcntl.ioctl(f.fileno(), self.FBIOGET_VSCREENINFO, bytes(160))
+        except OSError:
+            return None
+        xres, yres, xres_virtual, yres_virtual, xoffset, yoffset, bits_per_pixel = struct.unpack_from('7I', info)
+        return (xres, yres, bits_per_pixel)
+
+
+    @classmethod
+    def _sysfs_mode(cls, sysfs):
+        # Returns the visible (width, height) from sysfs, going by the
+        # current video mode, such as 'U:656x416p-0', or else the first of
+        # the modes listed.  Failing that, all there is is the virtual size.
+        for file in ('mode', 'modes'):
+            try:
+                with open(f'{sysfs}/{file}') as f:
+                    mode = f.readline().strip()
+            except OSError:
+                continue
+            size = mode.split(':')[-1].split('p')[0].split('i')[0]
+            if 'x' in size:
+                width, height = size.split('x')
+                if width.isdigit() and height.isdigit():
+                    return (int(width), int(height))
+        with open(f'{sysfs}/virtual_size') as f:
+            width, height = f.read().strip().split(',')
+        return (int(width), int(height))
+
+
+    def _map_framebuffer(self):
+        size = self.stride * self.fb_height
+        self._file = open(self.device, 'r+b')
+        # A plain file standing in for a framebuffer may need to be grown
+        if not self.device.startswith('/dev/') and os.path.getsize(self.device) < size:
+            self._file.truncate(size)
+        self._fb = mmap.mmap(self._file.fileno(), size)
+
+
+    def pixel(self, color):
+        # Returns the bytes for one pixel of a '#rrggbb' color, in the
+        # framebuffer's format (RGB565 or XRGB8888, little-endian)
+        color = color.lstrip('#')
+        r, g, b = int(color[0:2], 16), int(color[2:4], 16), int(color[4:6], 16)
+        if self.bits_per_pixel == 16:
+            return (((r >> 3) << 11) | ((g >> 2) << 5) | (b >> 3)).to_bytes(2, 'little')
+        return bytes((b, g, r, 0))
+
+
+    @classmethod
+    def builtin_font(cls):
+        # Returns (cell width, cell height, {char: [row bits, ...]}) for the
+        # built-in font.  Glyphs sit in the top-left of an 8x8 cell, one
+        # pixel in from the left.
+        codes = ''.join(BUILTIN_FONT.split())
+        glyphs = {}
+        for i in range(95):
+            rows = bytes.fromhex(codes[i*14:i*14 + 14])
+            glyphs[chr(32 + i)] = [row << 2 for row in rows] + [0]
+        return (8, 8, glyphs)
+
+
+    @classmethod
+    def load_psf(cls, path):
+        # Returns (cell width, cell height, {char: [row bits, ...]}) from a
+        # PSF version 1 or 2 console font.  Only the ASCII range is used.
+        opener = gzip.open if path.endswith('.gz') else open
+        with opener(path, 'rb') as f:
+            data = f.read()
+        if data[0:2] == b'\x36\x04':
+            width, height, header_size = 8, data[3], 4
+            count = 512 if data[2] & 0x01 else 256
+            glyph_size = height
+        elif data[0:4] == b'\x72\xb5\x4a\x86':
+            fields = [int.from_bytes(data[i:i + 4], 'little') for i in range(8, 32, 4)]
+            header_size, flags, count, glyph_size, height, width = fields
+        else:
+            raise ValueError(f'Not a PSF font: {path}')
+        row_bytes = (width + 7) // 8
+        glyphs = {}
+        for code in range(32, min(127, count)):
+            start = header_size + code * glyph_size
+            rows = []
+            for y in range(height):
+                row = data[start + y*row_bytes:start + (y + 1)*row_bytes]
+                rows.append(int.from_bytes(row, 'big') >> (row_bytes*8 - width))
+            glyphs[chr(code)] = rows
+        return (width, height, glyphs)
+
+
+    def build_atlas(self, cell_w, cell_h, glyphs, fg, bg):
+        # Rasterize every glyph into a list of finished pixel rows, already
+        # scaled and in framebuffer format, ready to copy straight in
+        atlas = {}
+        for c, rows in glyphs.items():
+            pixel_rows = []
+            for bits in rows:
+                row = b''.join((fg if bits >> (cell_w - 1 - x) & 1 else bg) * self.scale
+                               for x in range(cell_w))
+                pixel_rows.extend([row] * self.scale)
+            atlas[c] = pixel_rows
+        # Anything the font doesn't have is drawn as '?', or blank
+        atlas[None] = atlas.get('?', [bg * self.cell_w] * self.cell_h)
+        return atlas
+
+
+########  Drawing  ############################################################
+
+    def _on_text(self, row, col, b):
+        fb = self._fb
+        stride = self.stride
+        glyph_bytes = self.cell_w * self.bytes_per_pixel
+        top = (self.origin_y + row * self.cell_h) * stride
+        left = (self.origin_x + col * self.cell_w) * self.bytes_per_pixel
+        for i, code in enumerate(b):
+            rows = self._atlas.get(chr(code), self._atlas[None])
+            pos = top + left + i * glyph_bytes
+            for pixel_row in rows:
+                fb[pos:pos + glyph_bytes] = pixel_row
+                pos += stride
+
+
+    def _on_scroll(self):
+        # Move every pixel row of the text area up by one character row,
+        # all at once, then blank out the new bottom line
+        line_bytes = self.cell_h * self.stride
+        top = self.origin_y * self.stride
+        self._fb.move(top, top + line_bytes, (self.height - 1) * line_bytes)
+        self._fill(top + (self.height - 1) * line_bytes, line_bytes)
+
+
+    def _fill(self, start, length):
+        self._fb[start:start + length] = self._blank_pixel * (length // self.bytes_per_pixel)
+
+
+    def clear(self):
+        super().clear()
+        if self._fb is not None:
+            self._fill(0, len(self._fb))
+
+
+    def close(self):
+        if self._fb is not None:
+            self._fb.close()
+            self._file.close()
+            self._fb = None
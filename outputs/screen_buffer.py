@@ -0,0 +1,178 @@
+################################################################################
+#
+#   Screen Buffer
+#
+#   Headless output that keeps an in-memory copy of the screen instead of
+#   writing to a terminal.  Handy for tests, benchmarks, screenshots, and
+#   mirroring the feed somewhere else.
+#
+#   Behaves like a simple glass terminal:  text wraps at the right edge, a
+#   linefeed also returns the cursor to the left edge, and anything that goes
+#   past the bottom line scrolls the screen up.  Lines that scroll off the top
+#   are kept (up to a limit) as scrollback.  A few ANSI cursor sequences are
+#   understood too (cursor forward/back, column, home, clear screen, and
+#   erase to end of line).
+#
+#   - Initialization parameters:
+#
+#       paced       True/False (default = False).  If false, the Display
+#                   skips all print delays and beats, so whole playlist cycles
+#                   render in milliseconds.
+#       scrollback  Maximum number of scrolled-off lines to keep
+#                   (default = 1000)
+#
+#   Screen rows are stored as ASCII bytearrays in a ring, so scrolling never
+#   copies the screen contents.
+#
+################################################################################
+
+import collections
+import re
+from output_parent import OutputParent
+
+
+class Output(OutputParent):
+
+    # ANSI control sequences, any other ASCII control character, or anything
+    # outside of ASCII entirely
+    special_chars = re.compile(r'\x1b\[([0-9;]*)([@-~])|[^\x20-\x7e]')
+
+    def __init__(self, height, width, init):
+        super().__init__(height, width, init)
+        self.paced = init.get('paced', False)
+        self._scrollback = collections.deque(maxlen=init.get('scrollback', 1000))
+        self.clear()
+
+
+    def clear(self):
+        self._rows = [bytearray(b' ' * self.width) for i in range(self.height)]
+        # Index into _rows of the line currently at the top of the screen
+        self._top = 0
+        self._row = 0
+        # Column can equal width, meaning the line is full and the next
+        # printable character will wrap to the next line
+        self._col = 0
+
+
+    @property
+    def cursor(self):
+        # Current cursor position as (row, column), starting at zero
+        return (self._row, min(self._col, self.width - 1))
+
+
+    def _line(self, row):
+        return self._rows[(self._top + row) % self.height]
+
+
+    def _linefeed(self):
+        self._col = 0
+        if self._row < self.height - 1:
+            self._row += 1
+            return
+        # Scroll:  The top line goes to scrollback and gets reused,
+        # blanked out, as the new bottom line
+        top_line = self._rows[self._top]
+        self._scrollback.append(bytes(top_line))
+        top_line[:] = b' ' * self.width
+        self._top = (self._top + 1) % self.height
+        self._on_scroll()
+
+
+    def _put_text(self, s):
+        # s is all printable ASCII
+        b = s.encode('ascii')
+        pos = 0
+        while pos < len(b):
+            if self._col >= self.width:
+                self._linefeed()
+            chunk = b[pos:pos + self.width - self._col]
+            self._line(self._row)[self._col:self._col + len(chunk)] = chunk
+            self._on_text(self._row, self._col, chunk)
+            self._col += len(chunk)
+            pos += len(chunk)
+
+
+    def _control(self, c):
+        if c == '\n':
+            self._linefeed()
+        elif c == '\r':
+            self._col = 0
+        elif c == '\b':
+            self._col = max(min(self._col, self.width - 1) - 1, 0)
+        elif c == '\t':
+            self._put_text(' ' * (8 - self._col % 8))
+        elif ord(c) >= 0x80:
+            # Non-ASCII shouldn't get this far, but just in case...
+            self._put_text('?')
+
+
+    def _escape(self, params, command):
+        n = int(params) if params.isdigit() else 1
+        col = min(self._col, self.width - 1)
+        if command == 'C':
+            self._col = min(col + n, self.width - 1)
+        elif command == 'D':
+            self._col = max(col - n, 0)
+        elif command == 'G':
+            self._col = min(max(n - 1, 0), self.width - 1)
+        elif command == 'H' and params == '':
+            self._row = 0
+            self._col = 0
+        elif command == 'J' and params == '2':
+            self.clear()
+        elif command == 'K' and params in ('', '0'):
+            blanks = b' ' * (self.width - col)
+            self._line(self._row)[col:] = blanks
+            self._on_text(self._row, col, blanks)
+        # Anything else is quietly ignored
+
+
+    def supports_ansi(self):
+        return True
+
+
+    # Called whenever characters land on the screen or the screen scrolls.
+    # Nothing to do here, but subclasses that draw the screen somewhere (like
+    # the framebuffer output) can override them.
+    def _on_text(self, row, col, b):
+        pass
+
+    def _on_scroll(self):
+        pass
+
+
+    def write(self, s):
+        pos = 0
+        for match in self.special_chars.finditer(s):
+            if match.start() > pos:
+                self._put_text(s[pos:match.start()])
+            if match.group(2) is not None:
+                self._escape(match.group(1), match.group(2))
+            else:
+                self._control(match.group())
+            pos = match.end()
+        if pos < len(s):
+            self._put_text(s[pos:])
+
+
+########  Snapshot methods  ###################################################
+
+    def snapshot(self):
+        # Returns the current screen as a list of strings, one per row,
+        # each exactly [width] characters long
+        return [self._line(row).decode('ascii') for row in range(self.height)]
+
+
+    def screen_text(self):
+        # Returns the current screen as a single string, with trailing
+        # spaces removed from each line
+        return '\n'.join(line.rstrip() for line in self.snapshot())
+
+
+    def scrollback(self, n=None):
+        # Returns the last n lines (or all of them, if n is None) that have
+        # scrolled off the top of the screen, oldest first
+        lines = [line.decode('ascii') for line in self._scrollback]
+        if n is not None:
+            lines = lines[max(len(lines) - n, 0):]
+        return lines
@@ -0,0 +1,88 @@
+################################################################################
+#
+#   Serial Port
+#
+#   Sends the feed out a serial device (or pty) to a real teletype, glass
+#   terminal, TV Typewriter, etc.
+#
+#   Character speed comes from the line itself:  the port is set to the
+#   configured baud rate and every write waits (via tcdrain) until the
+#   characters have actually gone out, so the Display doesn't add any
+#   per-character delays of its own.  Beats and pauses still apply.  If the
+#   terminal needs to catch its breath, hardware (RTS/CTS) or software
+#   (XON/XOFF) flow control holds up the writes for us.
+#
+#   - Initialization parameters:
+#
+#       device        Path of the serial device (default = /dev/ttyUSB0).
+#                     A pty slave, such as /dev/pts/3, works too.
+#       baud          Line speed (default = 1200).  Must be one of the
+#                     standard rates known to termios.
+#       flow_control  'rtscts', 'xonxoff', or 'none' (default = 'none')
+#       crlf          True/False (default = True).  Send a carriage return
+#                     along with every linefeed, which most real terminals
+#                     need.
+#
+################################################################################
+
+import os
+import termios
+import tty
+from output_parent import OutputParent
+
+
+class Output(OutputParent):
+
+    # The line rate sets the character speed
+    line_paced = True
+
+    def __init__(self, height, width, init):
+        super().__init__(height, width, init)
+        self.device = init.get('device', '/dev/ttyUSB0')
+        self.baud = init.get('baud', 1200)
+        self.flow_control = init.get('flow_control', 'none')
+        self.crlf = init.get('crlf', True)
+        speed = getattr(termios, f'B{self.baud}', None)
+        if speed is None:
+            raise ValueError(f'Unsupported baud rate: {self.baud}')
+        if self.flow_control not in ('rtscts', 'xonxoff', 'none'):
+            raise ValueError(f'Unknown flow control: {self.flow_control}')
+        self.fd = os.open(self.device, os.O_RDWR | os.O_NOCTTY)
+        self._configure(speed)
+
+
+    def _configure(self, speed):
+        # Raw 8N1 at the requested speed, with the chosen flow control
+        tty.setraw(self.fd)
+        iflag, oflag, cflag, lflag, ispeed, ospeed, cc = termios.tcgetattr(self.fd)
+        cflag |= termios.CLOCAL | termios.CREAD
+        cflag &= ~termios.CRTSCTS
+        iflag &= ~(termios.IXON | termios.IXOFF | termios.IXANY)
+        if self.flow_control == 'rtscts':
+            cflag |= termios.CRTSCTS
+        elif self.flow_control == 'xonxoff':
+            iflag |= termios.IXON | termios.IXOFF
+        termios.tcsetattr(self.fd, termios.TCSANOW,
+                          [iflag, oflag, cflag, lflag, speed, speed, cc])
+
+
+    def write(self, s):
+        if self.crlf:
+            s = s.replace('\n', '\r\n')
+        b = s.encode('ascii', errors='replace')
+        while len(b) > 0:
+            b = b[os.write(self.fd, b):]
+        # Don't return until it's all actually out on the wire
+        termios.tcdrain(self.fd)
+
+
+    def clear(self):
+        # Most of the terminals we'd be talking to can't clear the screen,
+        # so the Display's blank lines will have to do
+        pass
+
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
@@ -0,0 +1,61 @@
+################################################################################
+#
+#   Standard Output
+#
+#   The default output.  Writes straight to the console via stdout.
+#
+#   - Initialization parameters:  none
+#   - When stdout is a terminal, reports how much output is still sitting in
+#     the kernel's tty queue, for the 'backlog_pacing' display setting
+#
+################################################################################
+
+import fcntl
+import os
+import struct
+import sys
+import termios
+from output_parent import OutputParent
+
+
+class Output(OutputParent):
+
+    def __init__(self, height, width, init):
+        super().__init__(height, width, init)
+        self.fd = sys.stdout.fileno()
+        self.encoding = sys.stdout.encoding or 'ascii'
+        self._can_check_backlog = os.isatty(self.fd)
+
+
+    def write(self, s):
+        # We skip print() and sys.stdout's buffering since the pacer already
+        # hands us just what should go out right now.  Anything print()-ed
+        # elsewhere has to get out ahead of us, though.
+        sys.stdout.flush()
+        b = s.encode(self.encoding, errors='replace')
+        while len(b) > 0:
+            b = b[os.write(self.fd, b):]
+
+
+    def clear(self):
+        os.system('clear')
+
+
+    def supports_ansi(self):
+        # Only if we're talking to a real terminal that isn't a dumb one
+        term = os.environ.get('TERM', '')
+        return os.isatty(self.fd) and term not in ('', 'dumb', 'unknown')
+
+
+    def backlog(self):
+        # Bytes written to the terminal that it hasn't gotten around to
+        # drawing yet.  Console drivers can fall well behind on slow
+        # hardware, even though our writes return right away.
+        if not self._can_check_backlog:
+            return None
+        try:
+            queued = fcntl.ioctl(self.fd, termios.TIOCOUTQ, b'\0' * 4)
+        except OSError:
+            self._can_check_backlog = False
+            return None
+        return struct.unpack('i', queued)[0]
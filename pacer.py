@@ -0,0 +1,203 @@
+################################################################################
+#
+#   Pacer Class
+#
+#   - Schedules character output against absolute monotonic deadlines, so the
+#     configured characters-per-second rate holds over any period no matter
+#     how long each write or wakeup actually takes
+#   - Characters whose deadline has already passed are grouped together and
+#     sent with a single write, so fast rates aren't limited by the
+#     granularity of time.sleep()
+#   - Sleeps (rather than spins) until the next deadline, leaving the CPU idle
+#     between characters
+#
+#   - Optionally reports how late each write went out, compared to when it
+#     was scheduled, to a PacingStats object (see pacing_stats.py)
+#   - Optionally keeps an eye on how much output is still queued up waiting
+#     to be shown (a slow console can be seconds behind what's been written
+#     to it) and holds off writing more until it's caught up, so characters
+#     go out at the rate the screen can really draw them and pauses start
+#     once the text before them is actually on the screen
+#
+#   Used by the Display class.  Segments shouldn't need to touch it directly.
+#
+################################################################################
+
+from clock import Clock
+
+
+class Pacer:
+
+    # Longest we'll sleep between checks while waiting on the output's backlog
+    BACKLOG_POLL = 0.1
+
+    def __init__(self, write, max_lag=0.25, clock=None, stats=None, backlog=None, max_backlog=16):
+        # Function that takes a string and sends it to the output
+        self._write = write
+        # All sleeping and time checks go through the clock
+        self._clock = clock if clock is not None else Clock()
+        # If we fall further behind schedule than this (in seconds), usually
+        # because a segment spent a while fetching data between prints, we
+        # start a fresh schedule rather than bursting out everything we
+        # "owe" in one go
+        self._max_lag = max_lag
+        # Monotonic time at which the next character is due
+        self._deadline = None
+        # Running counts, handy for checking how well we're doing
+        self.chars = 0
+        self.writes = 0
+        self.sleeps = 0
+        # PacingStats object, or None to skip measuring
+        self.stats = stats
+        # Function returning how many bytes the output has queued up but not
+        # yet shown (or None if it can't tell), and how many we'll allow
+        # before waiting.  No function means no checking.
+        self._backlog = backlog
+        self.max_backlog = max_backlog
+        self.backlog_stats = {'bytes':0,           # Queued at the last check
+                              'high_water':0,      # Most ever queued
+                              'waits':0,           # Times we held off writing
+                              'wait_seconds':0.0,
+                              'drain_cps':None,    # Measured drain rate
+                              'latency':0.0,       # Seconds the screen is behind
+                             }
+
+
+    def reset(self):
+        # Forget the current schedule.  The next output happens right away.
+        self._deadline = None
+
+
+    def _sync(self):
+        # Returns current monotonic time, re-anchoring the schedule if we
+        # don't have one yet or have fallen too far behind it
+        now = self._clock.monotonic()
+        if self._deadline is None or now - self._deadline > self._max_lag:
+            self._deadline = now
+        return now
+
+
+    def _sleep_until(self, deadline):
+        remaining = deadline - self._clock.monotonic()
+        if remaining > 0:
+            self._clock.sleep(remaining)
+            self.sleeps += 1
+
+
+    def emit(self, s, delay, kind='char'):
+        # Send string s, one character every 'delay' seconds.  The first
+        # character is due at the current deadline.  On return, the deadline
+        # has moved past the last character's delay, but we don't sleep for
+        # it--whatever comes next will wait for it instead.
+        if len(s) == 0:
+            return
+        now = self._sync()
+        if delay <= 0:
+            self._write(s)
+            self.chars += len(s)
+            self.writes += 1
+            return
+        start = self._deadline
+        pos = 0
+        while pos < len(s):
+            if now < self._deadline:
+                self._sleep_until(self._deadline)
+                now = self._clock.monotonic()
+            if self._backlog is not None and self._wait_for_backlog(self.max_backlog):
+                # Go at the rate the output is really drawing, rather than
+                # bursting out everything that came due while we waited
+                now = self._clock.monotonic()
+                self._deadline = max(self._deadline, now)
+            # Everything that's come due by now goes out in one write
+            num_due = min(int((now - self._deadline) / delay) + 1, len(s) - pos)
+            self._write(s[pos:pos+num_due])
+            if self.stats is not None:
+                # Count the whole batch at its average lateness
+                self.stats.record(kind, now - self._deadline - (num_due - 1) * delay / 2, num_due, now)
+            self.writes += 1
+            pos += num_due
+            self._deadline += num_due * delay
+        self.chars += len(s)
+        if self.stats is not None:
+            self.stats.record_span(kind, len(s), now - start + delay)
+
+
+    def emit_unit(self, s, delay, kind='char'):
+        # Send string s as a single write when the current deadline comes
+        # due, then wait 'delay' seconds before anything else.  Used for
+        # escape sequences, which shouldn't get split between writes.
+        self._sync()
+        self._sleep_until(self._deadline)
+        if self._backlog is not None and self._wait_for_backlog(self.max_backlog):
+            self._deadline = max(self._deadline, self._clock.monotonic())
+        self._write(s)
+        if self.stats is not None:
+            now = self._clock.monotonic()
+            self.stats.record(kind, now - self._deadline, 1, now)
+        self.chars += len(s)
+        self.writes += 1
+        self._deadline += delay
+
+
+    def skip(self, seconds):
+        # Push the schedule back by the given number of seconds without
+        # waiting for it now.  The next output will wait instead.
+        self._sync()
+        if seconds > 0:
+            self._deadline += seconds
+
+
+    def pause(self, seconds, kind='beat'):
+        # Hold the output for the given number of seconds.  Unlike emit(),
+        # this does sleep through to its deadline before returning, since
+        # callers expect a pause to actually block.
+        self._sync()
+        if self._backlog is not None and self._wait_for_backlog(0):
+            # Start the pause once the viewer has seen everything before it
+            self._deadline = max(self._deadline, self._clock.monotonic())
+        if seconds > 0:
+            self._deadline += seconds
+        self._sleep_until(self._deadline)
+        if self.stats is not None:
+            now = self._clock.monotonic()
+            self.stats.record(kind, now - self._deadline, 1, now)
+
+
+    def _wait_for_backlog(self, limit):
+        # Sleep until the output has no more than 'limit' bytes queued up.
+        # Returns True if we had to wait at all.
+        queued = self._backlog()
+        if queued is None:
+            # The output can't tell us, so stop asking
+            self._backlog = None
+            return False
+        self._note_backlog(queued)
+        if queued <= limit:
+            return False
+        start = self._clock.monotonic()
+        start_queued = queued
+        while queued > limit:
+            rate = self.backlog_stats['drain_cps']
+            wait = (queued - limit) / rate if rate else self.BACKLOG_POLL / 10
+            self._clock.sleep(min(max(wait, 0.001), self.BACKLOG_POLL))
+            queued = self._backlog() or 0
+        elapsed = self._clock.monotonic() - start
+        # Nothing else was written while we waited, so whatever left the
+        # queue tells us how fast the output really drains
+        if elapsed > 0 and start_queued > queued:
+            measured = (start_queued - queued) / elapsed
+            rate = self.backlog_stats['drain_cps']
+            self.backlog_stats['drain_cps'] = measured if rate is None else rate * 0.75 + measured * 0.25
+        self._note_backlog(queued)
+        self.backlog_stats['waits'] += 1
+        self.backlog_stats['wait_seconds'] += elapsed
+        return True
+
+
+    def _note_backlog(self, queued):
+        stats = self.backlog_stats
+        stats['bytes'] = queued
+        if queued > stats['high_water']:
+            stats['high_water'] = queued
+        if stats['drain_cps']:
+            stats['latency'] = queued / stats['drain_cps']
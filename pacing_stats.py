@@ -0,0 +1,194 @@
+################################################################################
+#
+#   Pacing Statistics
+#
+#   Measures how closely the Display keeps to its configured speeds.  Every
+#   paced write is checked against the time it was scheduled for, and how
+#   late it went out is recorded in a histogram for its kind of output:
+#
+#       char        Regular printed text (the 'cps' setting)
+#       newline     Newlines and the spaces that make them (the 'newline_cps'
+#                   setting), including any pause partway across the line
+#       beat        Pauses from wait_beats() and the like ('beat_seconds')
+#
+#   Every so often, a summary of each kind gets appended to a file as a line
+#   of JSON:  the effective characters per second, 50th/99th percentile and
+#   worst lateness (in milliseconds), and the number of late writes.  The
+#   characters per second only covers output typed out a character at a time,
+#   so it's None for beats, and for newlines made by moving the cursor.
+#
+#   Recording a write is just a few integer operations and a list increment,
+#   so it's fine to leave on all the time.  Turn it on with the
+#   'pacing_stats' display setting, either True or a dictionary with any of:
+#
+#       file        Path of the file to append summaries to
+#                   (default = 'pacing_stats.jsonl' in the RetroFeed
+#                   directory)
+#       interval    Seconds between summaries (default = 300).  Each summary
+#                   covers just the time since the one before.
+#       late_ms     How late, in milliseconds, a write has to be to count as
+#                   late (default = 10)
+#
+################################################################################
+
+import json
+import os
+import threading
+
+from clock import Clock
+
+
+class Histogram:
+    # Log-linear histogram in the style of HdrHistogram:  values are counted
+    # in buckets whose width grows with the value, so the whole range from a
+    # microsecond to a minute fits in a few hundred counters while every
+    # bucket stays within about 6% of the values in it.
+
+    # Values below 2*SUB_BUCKETS get a bucket each.  Above that, each doubling
+    # of the value range is split into SUB_BUCKETS buckets.
+    SUB_BUCKETS = 16
+    SUB_BITS = 4
+    UNIT = 1e-6       # Values are recorded in seconds, bucketed in microseconds
+    MAX_INDEX = 400   # Enough for about 268 seconds.  Longer ones all land
+                      # in this last bucket.
+
+    def __init__(self):
+        self.counts = [0] * (self.MAX_INDEX + 1)
+        self.total = 0
+        self.max = 0.0
+
+
+    @classmethod
+    def index_for(cls, value):
+        v = int(value / cls.UNIT)
+        if v < 2 * cls.SUB_BUCKETS:
+            return v if v > 0 else 0
+        shift = v.bit_length() - cls.SUB_BITS - 1
+        return min(shift * cls.SUB_BUCKETS + (v >> shift), cls.MAX_INDEX)
+
+
+    @classmethod
+    def bucket_range(cls, index):
+        # Returns the lowest and highest values (in seconds) counted in the
+        # bucket at index
+        if index < 2 * cls.SUB_BUCKETS:
+            return (index * cls.UNIT, index * cls.UNIT)
+        shift = index // cls.SUB_BUCKETS - 1
+        low = (index % cls.SUB_BUCKETS + cls.SUB_BUCKETS) << shift
+        return (low * cls.UNIT, (low + (1 << shift) - 1) * cls.UNIT)
+
+
+    def record(self, value, count=1):
+        self.counts[self.index_for(value)] += count
+        self.total += count
+        if value > self.max:
+            self.max = value
+
+
+    def percentile(self, p):
+        # Returns the value (in seconds) that p percent of recorded values
+        # are at or below, to within the bucket's precision
+        if self.total == 0:
+            return 0.0
+        target = max(1, self.total * p / 100)
+        running = 0
+        for index, count in enumerate(self.counts):
+            running += count
+            if running >= target:
+                return min(self.bucket_range(index)[1], self.max)
+        return self.max
+
+
+    def reset(self):
+        self.counts = [0] * (self.MAX_INDEX + 1)
+        self.total = 0
+        self.max = 0.0
+
+
+
+class PacingStats:
+
+    KINDS = ('char', 'newline', 'beat')
+
+    def __init__(self, settings=None, clock=None):
+        if not isinstance(settings, dict):
+            settings = {}
+        default_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'pacing_stats.jsonl')
+        self.path = settings.get('file', default_file)
+        self.interval = settings.get('interval', 300)
+        self.late_threshold = settings.get('late_ms', 10) / 1000
+        self._clock = clock if clock is not None else Clock()
+        self._lock = threading.Lock()
+        self._histograms = {kind:Histogram() for kind in self.KINDS}
+        self._late = dict.fromkeys(self.KINDS, 0)
+        # Characters typed out, and the seconds it took, for working out the
+        # effective characters per second
+        self._chars = dict.fromkeys(self.KINDS, 0)
+        self._seconds = dict.fromkeys(self.KINDS, 0.0)
+        self._period_start = self._clock.monotonic()
+        self._next_dump = self._period_start + self.interval
+
+
+    def record(self, kind, lateness, count=1, now=None):
+        # Note that 'count' writes (or characters) of the given kind went out
+        # 'lateness' seconds after they were due
+        with self._lock:
+            self._histograms[kind].record(lateness, count)
+            if lateness > self.late_threshold:
+                self._late[kind] += count
+        if now is not None and now >= self._next_dump:
+            self.dump(now)
+
+
+    def record_span(self, kind, chars, seconds):
+        # Note that 'chars' characters took 'seconds' to type out
+        with self._lock:
+            self._chars[kind] += chars
+            self._seconds[kind] += seconds
+
+
+    def report(self):
+        # Returns a dictionary of summaries, one per kind of output, for the
+        # current period.  Times are in milliseconds.
+        with self._lock:
+            summary = {}
+            for kind in self.KINDS:
+                h = self._histograms[kind]
+                seconds = self._seconds[kind]
+                summary[kind] = {'count':h.total,
+                                 'late':self._late[kind],
+                                 'p50_ms':round(h.percentile(50) * 1000, 3),
+                                 'p99_ms':round(h.percentile(99) * 1000, 3),
+                                 'max_ms':round(h.max * 1000, 3),
+                                 'cps':round(self._chars[kind] / seconds, 2) if seconds > 0 else None,
+                                }
+            return summary
+
+
+    def reset(self, now=None):
+        with self._lock:
+            for kind in self.KINDS:
+                self._histograms[kind].reset()
+                self._late[kind] = 0
+                self._chars[kind] = 0
+                self._seconds[kind] = 0.0
+            self._period_start = now if now is not None else self._clock.monotonic()
+            self._next_dump = self._period_start + self.interval
+
+
+    def dump(self, now=None):
+        # Append the current period's summary to the file and start a new
+        # period
+        if now is None:
+            now = self._clock.monotonic()
+        entry = {'time':self._clock.now().isoformat(timespec='seconds'),
+                 'seconds':round(now - self._period_start, 1),
+                }
+        entry.update(self.report())
+        self.reset(now)
+        try:
+            with open(self.path, 'a') as f:
+                f.write(json.dumps(entry) + '\n')
+        except OSError:
+            # Not worth interrupting the feed over
+            pass
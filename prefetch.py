@@ -0,0 +1,231 @@
+################################################################################
+#
+#   Prefetcher Class
+#
+#   Refreshes segment data in the background, ahead of time, so segments
+#   find fresh data waiting for them when their turn comes around rather
+#   than stopping the feed to fetch it.
+#
+#   - Any segment that fetches data is refreshed shortly before its data
+#     would go stale (and right away, at startup, if it has none)
+#   - All the refreshes that come due are run at once, as tasks on one
+#     asyncio event loop in its own thread.  Segments with an async
+#     refresh_data_async() method are awaited directly, and can overlap
+#     their own requests.  Plain refresh_data() methods are run on a small
+#     pool of worker threads.  Either way, a dozen sources take about as
+#     long as the slowest one.
+#   - The refresh runs on a copy of the segment.  Only once it's done is the
+#     new 'data' handed to the real segment, which swaps it in before its
+#     next showing, so a segment never sees half-fetched data, or its data
+#     changing partway through a showing.
+#   - Refreshes are started through the segment's start_refresh(), which
+#     also starts the ones from refresh_if_needed(), so a segment is never
+#     refreshed twice at once.  Once the main program hands the prefetcher
+#     to SegmentParent.use_prefetcher(), those refreshes run here as well
+#     (see refresh()), on the same workers and under the same per-source
+#     limits.
+#   - Refreshes of the same kind of segment (e.g., several uk_weather
+#     locations) are limited to a few at a time, to go easy on the source
+#   - A segment can opt out by setting its 'prefetch' attribute to False, or
+#     per instance with 'prefetch': False in its config.  Those segments
+#     just refresh themselves in show() like always, as does any segment
+#     whose background refresh failed.
+#   - If any fetch during a refresh fails (say, because the site's circuit
+#     breaker is open), the new data is thrown away and the segment keeps
+#     showing its last good data until a later try works
+#   - "Shortly before going stale" is up to each segment's refresh policy
+#     (see refresh_policy.py), so a page the site says is good for an hour
+#     isn't fetched again every few minutes
+#
+#   Settings, from the 'prefetch' table of the config (all optional):
+#
+#       enabled         True/False (default = True)
+#       workers         Worker threads for refresh_data() and fetch_async()
+#                       (default = 8)
+#       per_source      Refreshes of the same segment module allowed at once
+#                       (default = 1)
+#       lead_seconds    How far ahead of going stale to refresh (default = 60,
+#                       but never more than half the segment's refresh time)
+#       retry_seconds   How long to wait before trying again after a
+#                       background refresh fails (default = 60)
+#
+#   Used by retrofeed.py.
+#
+################################################################################
+
+import asyncio
+import concurrent.futures
+import copy
+import datetime as dt
+import threading
+
+
+class Prefetcher:
+
+    def __init__(self, segments, settings=None):
+        if settings is None:
+            settings = {}
+        self.segments = segments
+        self.per_source = settings.get('per_source', 1)
+        self.lead = dt.timedelta(seconds=settings.get('lead_seconds', 60))
+        self.retry_seconds = settings.get('retry_seconds', 60)
+        self._lock = threading.Lock()
+        # One semaphore per source (segment module), only ever touched from
+        # the event loop's thread
+        self._sources = {}
+        # The refresh in progress for each segment, by key
+        self._in_flight = {}
+        # Monotonic time of the last failed refresh, by key
+        self._failed = {}
+        self._stats = {'submitted':0, 'completed':0, 'errors':0, 'waits':0, 'wait_seconds':0.0,
+                       'last_error':None}
+        # Synchronous refreshes go to the loop's default executor
+        self._loop = asyncio.new_event_loop()
+        self._loop.set_default_executor(
+            concurrent.futures.ThreadPoolExecutor(max_workers=settings.get('workers', 8),
+                                                  thread_name_prefix='prefetch'))
+        threading.Thread(target=self._loop.run_forever, name='prefetch', daemon=True).start()
+
+
+    @classmethod
+    def wants_prefetch(cls, segment):
+        if hasattr(segment, 'fetches_data'):
+            fetches = segment.fetches_data()
+        else:
+            fetches = hasattr(segment, 'refresh_data')
+        return fetches and hasattr(segment, 'refresh') and getattr(segment, 'prefetch', True)
+
+
+    @classmethod
+    def source_of(cls, segment):
+        return type(segment).__module__
+
+
+    def is_due(self, segment):
+        lead = min(self.lead, segment.refresh / 2)
+        return segment.refresh_due(lead)
+
+
+    def poll(self):
+        # Start a refresh for every segment that's about to need one.  Call
+        # this every so often from the main loop.
+        for key, segment in self.segments.items():
+            if not self.wants_prefetch(segment):
+                continue
+            with self._lock:
+                future = self._in_flight.get(key)
+                if future is not None and not future.done():
+                    continue
+                if key in self._failed and segment.clock.monotonic() - self._failed[key] < self.retry_seconds:
+                    continue
+                if not self.is_due(segment):
+                    continue
+                self._start(key, segment)
+
+
+    def refresh(self, segment):
+        # Starts refreshing the passed segment right away, due or not, unless
+        # it's already being refreshed.  Returns the Future for the refresh,
+        # or None if the segment isn't one of ours.  (For refresh_if_needed(),
+        # by way of SegmentParent.use_prefetcher().)
+        for key, s in self.segments.items():
+            if s is segment:
+                with self._lock:
+                    return self._start(key, segment)
+        return None
+
+
+    def _start(self, key, segment):
+        # Call with the lock held
+        start = lambda: asyncio.run_coroutine_threadsafe(self._refresh(key, segment), self._loop)
+        if hasattr(segment, 'start_refresh'):
+            future, started = segment.start_refresh(start)
+        else:
+            future, started = start(), True
+        self._in_flight[key] = future
+        if started:
+            self._stats['submitted'] += 1
+        return future
+
+
+    def wait(self, key):
+        # Wait for any refresh of the keyed segment that's in progress, but
+        # only if its data is too old to show in the meantime, and then only
+        # until the segment's deadline.  (Or about as long as a request can
+        # take, if there's no data at all, same as refresh_if_needed().)
+        # Returns right away otherwise.
+        with self._lock:
+            future = self._in_flight.get(key)
+        if future is None or future.done():
+            return
+        segment = self.segments[key]
+        if hasattr(segment, 'freshness') and segment.freshness() != segment.EXPIRED:
+            return
+        if hasattr(segment, 'refresh_wait'):
+            timeout = segment.refresh_wait()
+        elif getattr(segment, 'data', None) is not None:
+            timeout = getattr(segment, 'deadline', None)
+        else:
+            timeout = None
+        start = segment.clock.monotonic()
+        concurrent.futures.wait([future], timeout)
+        with self._lock:
+            self._stats['waits'] += 1
+            self._stats['wait_seconds'] += segment.clock.monotonic() - start
+
+
+    def wait_all(self):
+        # Wait for every refresh in progress
+        with self._lock:
+            futures = list(self._in_flight.values())
+        concurrent.futures.wait(futures)
+
+
+    async def _refresh(self, key, segment):
+        # Runs on the event loop
+        source = self.source_of(segment)
+        if source not in self._sources:
+            self._sources[source] = asyncio.Semaphore(self.per_source)
+        async with self._sources[source]:
+            clone = copy.copy(segment)
+            if hasattr(clone, 'begin_update'):
+                clone.begin_update()
+            try:
+                if hasattr(clone, 'refresh_data_async'):
+                    await clone.refresh_data_async()
+                else:
+                    await self._loop.run_in_executor(None, clone.refresh_data)
+            except Exception as e:
+                # Leave the old data alone.  The segment will try again
+                # itself once it goes stale.
+                with self._lock:
+                    self._stats['errors'] += 1
+                    self._stats['last_error'] = f'{key}: {e!r}'
+                    self._failed[key] = segment.clock.monotonic()
+                return
+            if hasattr(clone, 'end_update') and not clone.end_update(segment.data):
+                with self._lock:
+                    self._stats['errors'] += 1
+                    self._stats['last_error'] = f'{key}: fetch failed, keeping last good data'
+                    self._failed[key] = segment.clock.monotonic()
+                return
+            if hasattr(segment, 'offer_new_data'):
+                segment.offer_new_data(clone.data)
+            else:
+                segment.data = clone.data
+            with self._lock:
+                self._failed.pop(key, None)
+                self._stats['completed'] += 1
+
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['in_flight'] = sum(1 for f in self._in_flight.values() if not f.done())
+        return stats
+
+
+    def close(self):
+        for future in list(self._in_flight.values()):
+            future.cancel()
+        self._loop.call_soon_threadsafe(self._loop.stop)
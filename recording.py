@@ -0,0 +1,82 @@
+################################################################################
+#
+#   Session Recording and Replay
+#
+#   Recorder:  Records everything a Display writes, with timestamps, to an
+#              asciicast v2 file (the format used by asciinema).  Each chunk
+#              of output is appended to the file as soon as it's written, so
+#              memory use stays flat no matter how long the feed runs.
+#
+#   replay():  Plays a recording back through a Display's output at the
+#              original pace, or faster.  No segments, no fetching.
+#
+#   Record by setting the 'record' display setting to a file path.  The path
+#   may include strftime() codes, such as 'feed-%Y%m%d-%H%M%S.cast', so each
+#   run gets its own file.  Play back with:
+#
+#       python retrofeed.py replay <file> [speed]
+#
+################################################################################
+
+import json
+import os
+
+from clock import Clock
+
+
+class Recorder:
+
+    def __init__(self, path, height, width, clock=None):
+        self._clock = clock if clock is not None else Clock()
+        self.path = self._clock.now().strftime(path)
+        self._start = self._clock.monotonic()
+        # Line buffered, so every event lands in the file right away
+        self._file = open(self.path, 'w', buffering=1)
+        header = {'version':2,
+                  'width':width,
+                  'height':height,
+                  'timestamp':int(self._clock.time()),
+                  'env':{'TERM':os.environ.get('TERM', '')},
+                 }
+        self._file.write(json.dumps(header) + '\n')
+
+
+    def record(self, s):
+        # Meant to be used as a Display listener
+        if self._file is None:
+            return
+        elapsed = round(self._clock.monotonic() - self._start, 6)
+        self._file.write(json.dumps([elapsed, 'o', s]) + '\n')
+
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+
+def read_recording(path):
+    # Yields (seconds, text) for every output event in an asciicast v2 file
+    with open(path) as f:
+        header = json.loads(f.readline())
+        if header.get('version') != 2:
+            raise ValueError(f'Not an asciicast v2 recording: {path}')
+        for line in f:
+            if line.strip() == '':
+                continue
+            elapsed, kind, data = json.loads(line)
+            if kind == 'o':
+                yield (elapsed, data)
+
+
+
+def replay(d, path, speed=1):
+    # Play a recording through Display d, at [speed] times the original pace.
+    # A speed of zero (or less) plays it back as fast as possible.
+    start = d.clock.monotonic()
+    for elapsed, s in read_recording(path):
+        if speed > 0:
+            d.clock.sleep(start + elapsed / speed - d.clock.monotonic())
+        d.write_raw(s)
+    d.drain()
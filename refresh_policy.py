@@ -0,0 +1,167 @@
+################################################################################
+#
+#   Refresh Policies
+#
+#   Decide how long a segment's data stays fresh.  Every segment has one, in
+#   its 'refresh_policy' attribute, and SegmentParent asks it via
+#   fresh_until() whenever it needs to know whether the data is stale.
+#
+#   - RefreshPolicy:        The default.  Data is good for the segment's
+#                           refresh time, or for as long as the site said it
+#                           would be (Cache-Control max-age, or Expires), if
+#                           that's longer.  No point asking again for a page
+#                           the server told us won't change for an hour.
+#   - MarketHoursRefresh:   For stock prices.  Refreshes every [refresh]
+#                           minutes while the market is open, plus once just
+#                           after the close, for the closing numbers.  Then
+#                           nothing changes until just after it next opens,
+#                           so that's when the data goes stale.
+#   - ForecastIssueRefresh: For forecasts that come out on a schedule.
+#                           Data is good until shortly after the next
+#                           forecast should have been issued.
+#
+#   A policy only ever looks at the segment and its data, and keeps nothing
+#   of its own, so one can be shared by any number of segments.
+#
+#   Times in the data are naive local datetimes, same as self.clock.now().
+#
+#   Used by segment_parent.py and some of the segments.
+#
+################################################################################
+
+import datetime as dt
+import email.utils
+import re
+
+try:
+    from zoneinfo import ZoneInfo
+except ImportError:
+    ZoneInfo = None
+
+
+def lifetime_from_headers(headers, now=None):
+    # Returns the seconds a response says it's good for, going by its
+    # Cache-Control or Expires header, or None if it doesn't say
+    cache_control = headers.get('Cache-Control', '').lower()
+    if 'no-store' in cache_control or 'no-cache' in cache_control:
+        return 0
+    match = re.search(r'(?:^|[,\s])max-age\s*=\s*"?(\d+)', cache_control)
+    if match:
+        age = headers.get('Age', '0')
+        age = int(age) if age.isdigit() else 0
+        return max(0, int(match.group(1)) - age)
+    expires = headers.get('Expires')
+    if expires is None:
+        return None
+    try:
+        expires = email.utils.parsedate_to_datetime(expires)
+        date = headers.get('Date')
+        date = email.utils.parsedate_to_datetime(date) if date else now
+    except (TypeError, ValueError):
+        # An invalid Expires (like "0") means already expired
+        return 0
+    if date is None:
+        date = dt.datetime.now(dt.timezone.utc)
+    if expires.tzinfo is None or date.tzinfo is None:
+        return 0
+    return max(0, int((expires - date).total_seconds()))
+
+
+
+class RefreshPolicy:
+
+    # Longest we'll believe a server's max-age, just in case
+    MAX_LIFETIME = dt.timedelta(hours=24)
+
+    def __init__(self, honor_cache_headers=True):
+        self.honor_cache_headers = honor_cache_headers
+
+
+    def fresh_until(self, segment, data):
+        # Returns the local datetime at which the data goes stale
+        until = data['fetched_on'] + segment.refresh
+        lifetime = data.get('max_age') if self.honor_cache_headers else None
+        if lifetime:
+            lifetime = min(dt.timedelta(seconds=lifetime), self.MAX_LIFETIME)
+            until = max(until, data['fetched_on'] + lifetime)
+        return until
+
+
+
+class MarketHoursRefresh(RefreshPolicy):
+
+    def __init__(self, timezone='America/New_York', open_time=dt.time(9, 30), close_time=dt.time(16, 0),
+                 holidays=(), settle=dt.timedelta(minutes=5)):
+        super().__init__(honor_cache_headers=False)
+        self.open_time = open_time
+        self.close_time = close_time
+        # Dates the market is closed all day, as date objects or 'YYYY-MM-DD'
+        self.holidays = {dt.date.fromisoformat(h) if isinstance(h, str) else h for h in holidays}
+        # Gives the site time to catch up after the open or close
+        self.settle = settle
+        try:
+            self.zone = ZoneInfo(timezone)
+        except Exception:
+            # No time zone database.  Just use the plain refresh time.
+            self.zone = None
+
+
+    def is_trading_day(self, day):
+        return day.weekday() < 5 and day not in self.holidays
+
+
+    def is_open(self, when):
+        # 'when' is an aware datetime in the market's time zone
+        return self.is_trading_day(when.date()) and self.open_time <= when.time() < self.close_time
+
+
+    def next_open(self, when):
+        day = when.date()
+        if when.time() >= self.open_time:
+            day += dt.timedelta(days=1)
+        while not self.is_trading_day(day):
+            day += dt.timedelta(days=1)
+        return dt.datetime.combine(day, self.open_time, tzinfo=self.zone)
+
+
+    def fresh_until(self, segment, data):
+        if self.zone is None:
+            return super().fresh_until(segment, data)
+        fetched = data['fetched_on'].astimezone(self.zone)
+        close = dt.datetime.combine(fetched.date(), self.close_time, tzinfo=self.zone)
+        if self.is_open(fetched):
+            until = min(fetched + segment.refresh, close + self.settle)
+        elif self.is_trading_day(fetched.date()) and close <= fetched < close + self.settle / 2:
+            # Too soon after the close for the closing numbers to be in.
+            # (A fetch later in the settle time counts as the post-close
+            # one, since the prefetcher gets a little ahead of the data
+            # going stale.)
+            until = close + self.settle
+        else:
+            # Already have the closing numbers
+            until = self.next_open(fetched) + self.settle
+        # Back to naive local time
+        return until.astimezone().replace(tzinfo=None)
+
+
+
+class ForecastIssueRefresh(RefreshPolicy):
+
+    def __init__(self, issue_every=dt.timedelta(hours=1), publish_delay=dt.timedelta(minutes=10)):
+        super().__init__(honor_cache_headers=False)
+        self.issue_every = issue_every
+        # How long after the issue time a new forecast usually shows up
+        self.publish_delay = publish_delay
+
+
+    def fresh_until(self, segment, data):
+        # Needs the data's 'issued_at' time.  Without one, falls back to the
+        # plain refresh time.
+        issued = data.get('issued_at')
+        if issued is None:
+            return super().fresh_until(segment, data)
+        until = issued + self.issue_every + self.publish_delay
+        if until <= data['fetched_on']:
+            # The next forecast is late.  Keep checking at the usual pace.
+            until = data['fetched_on'] + segment.refresh
+        return until
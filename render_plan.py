@@ -0,0 +1,84 @@
+################################################################################
+#
+#   Render Plan Class
+#
+#   A segment's whole showing, prepared ahead of time:  the finished text
+#   lines (already wrapped, cleaned, uppercased, etc.), newlines, and beats,
+#   in order.  Building one does all the formatting and data lookups up
+#   front, so nothing but paced output is left for the Display to do once
+#   playback starts.  Since the plan is complete before anything is shown,
+#   its length and running time are known in advance too.  (The main loop
+#   uses duration() to skip a showing that wouldn't finish before a
+#   simulation's end time.)
+#
+#   Build a plan with the same methods you'd call on the Display:
+#
+#       plan = RenderPlan(self.d)
+#       plan.print_header('Stocks', '$')
+#       plan.newline()
+#       plan.print(f'As of {time_text}')
+#       plan.wait_beats(2)
+#
+#   Then either return it from a segment's render() method (see
+#   segment_parent.py) or play it directly with self.d.play(plan).
+#
+################################################################################
+
+
+class RenderPlan:
+
+    def __init__(self, display):
+        self.d = display
+        # Each op is a tuple:  ('text', string), ('newline', delay or None),
+        # or ('beats', n)
+        self.ops = []
+
+
+    def print(self, s='', end='\n'):
+        text = ''.join(line + end for line in self.d.layout(s))
+        if text == '':
+            return
+        # Consecutive text all goes out at the same pace, so merge it
+        if len(self.ops) > 0 and self.ops[-1][0] == 'text':
+            self.ops[-1] = ('text', self.ops[-1][1] + text)
+        else:
+            self.ops.append(('text', text))
+
+
+    def newline(self, delay=None):
+        self.ops.append(('newline', delay))
+
+
+    def wait_beats(self, n=1):
+        if n < 0:
+            n = 1
+        self.ops.append(('beats', n))
+
+
+    def print_header(self, s, left_marker=' ', right_marker=None):
+        for part, end in self.d.header_parts(s, left_marker, right_marker):
+            self.print(part, end=end)
+
+
+    @property
+    def char_count(self):
+        # Number of characters of text in the plan, not counting newlines
+        # made with newline()
+        return sum(len(op[1]) for op in self.ops if op[0] == 'text')
+
+
+    def duration(self):
+        # Seconds the plan takes to play at the Display's configured speeds
+        seconds = self.char_count * self.d.print_delay
+        for op in self.ops:
+            if op[0] == 'newline':
+                seconds += (self.d.width + 1) * self.d.newline_delay
+                if op[1] is not None:
+                    seconds += op[1]
+            elif op[0] == 'beats':
+                seconds += op[1] * self.d.beat_delay
+        return seconds
+
+
+    def __len__(self):
+        return len(self.ops)
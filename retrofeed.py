@@ -1,13 +1,19 @@
 # Standard library imports
 import datetime as dt
 import importlib.util
-import os
+import signal
 import sys
 import textwrap as tw
 import time
 
 # RetroFeed imports
+from clock import SimulatedClock
 from display import Display
+from http_client import HttpClient
+from prefetch import Prefetcher
+import recording
+from segment_parent import SegmentParent
+from state import StateStore
 
 
 
@@ -80,7 +86,29 @@ CONFIG = {'display': {'height': 24,
                                  'lucky',
                                  'otd',
                                 ]
-                      }
+                      },
+
+          # Optional.  Segment data gets refreshed in the background, ahead of
+          # time, so the feed doesn't have to stop and wait for it.  See
+          # prefetch.py for details.
+          'prefetch': {'enabled': True,
+                       'workers': 8,
+                       'per_source': 1,
+                       'lead_seconds': 60,
+                      },
+
+          # Optional.  Timeouts, etc., for the web requests segments make.
+          # See http_client.py for details.
+          'http': {'connect_timeout': 5,
+                   'read_timeout': 20,
+                  },
+
+          # Optional.  Segment data gets saved every so often, and restored
+          # at startup, so a restart doesn't mean fetching everything all
+          # over again.  See state.py for details.
+          'state': {'enabled': True,
+                    'interval': 300,
+                   },
          }
 
 
@@ -155,15 +183,52 @@ def parse_seg_key_and_fmt(seg):
     
     
 def show_title(d):
-    os.system('clear')
-    for i in range(24):
-        print()
+    d.clear()
     d.print(f'RETROFEED - VERSION {VERSION}')
     d.print('Copyright (c) 2023 Jeff Jetton')
     d.print('MIT License')
     d.newline()
 
 
+def run_playlist(d, segments, order, segment_pause, end_time=None, prefetcher=None, state=None):
+    # Show the playlist over and over, forever, or until the clock reaches
+    # end_time.  Segments that lay out their showing ahead of time (see
+    # render_plan.py) are skipped if it wouldn't be over by then.
+    while end_time is None or d.clock.monotonic() < end_time:
+        
+        for seg in order:
+            if end_time is not None and d.clock.monotonic() >= end_time:
+                break
+            d.newline()
+            d.newline()
+
+            (seg_key, seg_fmt) = parse_seg_key_and_fmt(seg)
+
+            if seg_key not in segments:
+                d.newline()
+                d.print_header(f'Missing Segment "{seg_key}"', '*')
+                d.newline(segment_pause)
+                continue
+            
+            # Get ahead on any refreshes coming due, and if this segment's
+            # data is too old to show, give its refresh a chance to finish
+            if prefetcher is not None:
+                prefetcher.poll()
+                prefetcher.wait(seg_key)
+
+            # Show the segment, with any special formating
+            time_left = None
+            if end_time is not None:
+                time_left = end_time - d.clock.monotonic()
+            segments[seg_key].play(seg_fmt, time_left)
+            
+            d.newline()
+            d.newline(segment_pause)
+
+            if state is not None:
+                state.save_if_due(segments)
+
+
 ###############################################################################
 
 def main():
@@ -174,13 +239,36 @@ def main():
 
     check_config_tables(config)
 
-    # Override with faster timings if there are any command-line args at all
-    if len(sys.argv) > 1:
+    # Replay mode:  python retrofeed.py replay <file> [speed]
+    # Just plays back a recording--no segments, no fetching
+    if len(sys.argv) > 2 and sys.argv[1] == 'replay':
+        speed = float(sys.argv[3]) if len(sys.argv) > 3 else 1
+        display_settings = dict(config['display'])
+        display_settings.pop('record', None)
+        recording.replay(Display(display_settings), sys.argv[2], speed)
+        return
+
+    # Simulation mode:  python retrofeed.py simulate <hours>
+    # Runs the playlist on a simulated clock into an in-memory screen, so
+    # hours of cycles (and scheduled refreshes) go by in the time it takes
+    # to do the fetching.  Prints the final screen at the end.
+    clock = None
+    end_time = None
+    if len(sys.argv) > 2 and sys.argv[1] == 'simulate':
+        clock = SimulatedClock()
+        end_time = clock.monotonic() + float(sys.argv[2]) * 3600
+        config['display'] = dict(config['display'],
+                                 output={'module':'screen_buffer', 'paced':True})
+    # Override with faster timings if there are any other command-line args
+    elif len(sys.argv) > 1:
         config = override_timings(config)
 
     # Create Display object from config settings
     # This will be used by all segments
-    d = Display(config['display'])
+    d = Display(config['display'], clock=clock)
+
+    # All segments share one pool of web connections
+    SegmentParent.use_http_client(HttpClient(config.get('http', {}), d.clock))
 
     # Segment modules may display intros on initialization,
     # but we want the main title to come first
@@ -188,6 +276,24 @@ def main():
         show_title(d)
     segments = instantiate_segments(config, d)
 
+    # Pick up any data saved last time (but not when simulating, since
+    # simulated fetch times would muddle up the real ones)
+    state = None
+    state_settings = config.get('state', {})
+    if end_time is None and state_settings.get('enabled', True):
+        state = StateStore(state_settings, VERSION, config['segments'], d.clock)
+        state.load(segments)
+        # Let a plain "kill" shut us down cleanly enough to save first
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    # Start fetching everyone's data in the background right away
+    prefetcher = None
+    prefetch_settings = config.get('prefetch', {})
+    if prefetch_settings.get('enabled', True):
+        prefetcher = Prefetcher(segments, prefetch_settings)
+        SegmentParent.use_prefetcher(prefetcher)
+        prefetcher.poll()
+
     # Unpack the playlist
     segment_pause = config['playlist']['segment_pause']
     order = config['playlist']['order']
@@ -195,26 +301,21 @@ def main():
     d.newline()
     d.newline()
     
-    # Main loop
-    while True:
-        
-        for seg in order:
-            d.newline()
-            d.newline()
-
-            (seg_key, seg_fmt) = parse_seg_key_and_fmt(seg)
-
-            if seg_key not in segments:
-                d.newline()
-                d.print_header(f'Missing Segment "{seg_key}"', '*')
-                d.newline(segment_pause)
-                continue
-            
-            # Show the segment, with any special formating
-            segments[seg_key].show(seg_fmt)
-            
-            d.newline()
-            d.newline(segment_pause)
+    # Main loop (which only ends when simulating).  Save the segments'
+    # data on the way out, however we go.
+    try:
+        run_playlist(d, segments, order, segment_pause, end_time, prefetcher, state)
+    finally:
+        if state is not None:
+            state.save(segments)
+
+    # Only get here after a simulation
+    if prefetcher is not None:
+        SegmentParent.use_prefetcher(None)
+        prefetcher.close()
+    d.drain()
+    print(d.output.screen_text())
+    print(f'Simulated time: {dt.timedelta(seconds=round(clock.elapsed))}')
 
         
 
@@ -9,10 +9,91 @@
 #
 #     __init__():     Takes care of most standard instantiation tasks
 #                     Call as super().__init__(display, init)
+#                     Handles these initialization parameters for you:
+#                       refresh   Minutes until data is due for a refresh
+#                       expire    Minutes until data is too old to show at
+#                                 all (default = 4 times refresh)
+#                       deadline  Most seconds show() waits on a refresh, when
+#                                 there's old data to fall back on (default 10)
+#                       prefetch  False keeps the segment out of background
+#                                 refreshing (see prefetch.py)
 #
 #     data_is_stale:  Returns boolean indicating whether you need a refresh
 #
-#     get_soup:       Returns a BeautifulSoup object from a url
+#     fresh_until:    Returns when the data goes stale, according to the
+#                     segment's refresh_policy (see refresh_policy.py).  By
+#                     default, that's after the refresh time, or after as
+#                     long as the site's Cache-Control or Expires header
+#                     said the page was good for, whichever is later.
+#
+#     freshness:      Returns FRESH, STALE (due for a refresh, but still fine
+#                     to show), or EXPIRED (too old to show, or no data yet).
+#                     Data expires (expire - refresh) minutes after going
+#                     stale.
+#
+#     refresh_if_needed:  What show() should call before showing anything.
+#                     Does nothing if the data's fresh.  If it's stale,
+#                     starts a refresh in the background and returns right
+#                     away, so the stale data gets shown this time.  Only
+#                     if it's expired does it wait for the refresh (showing
+#                     an update message), and then only until the deadline
+#                     (or, with no data at all, about as long as one HTTP
+#                     request can take).  If that still leaves no data, the
+#                     segment gets its stub_data(), if it has any.
+#
+#     stub_data:      Override to return placeholder data, with everything
+#                     show() reads, for when there's nothing better
+#
+#     start_refresh:  Where every background refresh of the segment starts,
+#                     from refresh_if_needed() or the prefetcher, so there's
+#                     only ever one running.  If the main program has a
+#                     prefetcher (see use_prefetcher), refresh_if_needed()'s
+#                     refreshes run there too, under the same limits.  A finished refresh's data waits
+#                     (see offer_new_data) until the segment's next showing,
+#                     so the data never changes in the middle of one.
+#
+#     refresh_due:    Same, but looking a little ahead.  Used to refresh data
+#                     in the background before it goes stale (see prefetch.py)
+#
+#     update_data:    Calls refresh_data(), but if any fetch along the way
+#                     failed, keeps the data we had before.  Also notes in
+#                     the data how long the fetched pages said they were
+#                     good for, as 'max_age' (in seconds).
+#
+#     clock:          The Display's clock object.  Use self.clock.now() instead
+#                     of dt.datetime.now() so segments work with simulated time
+#
+#     fetch:          Returns the HTTP response for a url, using a connection
+#                     pool shared by all segments (see http_client.py).
+#                     Use this for all web requests.  Pass max_bytes to cap
+#                     how much of the page is read, and stop (a string, or
+#                     list of strings found in order) to quit reading once
+#                     you've got the part of the page you need.
+#
+#     fetch_async:    Coroutine version of fetch(), for refresh_data_async()
+#
+#     get_soup:       Returns a BeautifulSoup object from a url.  Segments
+#                     asking for the same url at the same time share one
+#                     request and one parse, so don't modify the soup.
+#                     Can use a faster parser than html.parser, and build
+#                     only the tags you need (see html_parsers.py).
+#
+#     play:           Called by the main program to show the segment.  Shows
+#                     the RenderPlan returned by render(), if there is one,
+#                     otherwise calls show().  If there's no data to show,
+#                     it says so instead.  Given the seconds left to play
+#                     in, skips a plan that would run longer than that.
+#
+#   A segment can either override show() and print directly to the Display,
+#   or override render() and return a RenderPlan (see render_plan.py) with
+#   everything already laid out.  The render() approach gets all formatting
+#   and data lookups out of the way before any output starts.
+#
+#   Segments that fetch data put it in self.data with a refresh_data()
+#   method, or else a coroutine named refresh_data_async().  The async
+#   version can await several fetch_async() calls at once with
+#   asyncio.gather(), and is what the background prefetcher prefers.  Either
+#   way, the other one is provided here.
 #
 #
 #   Jeff Jetton, April 2023
@@ -21,13 +102,71 @@
 
 
 from abc import ABC, abstractmethod
-from bs4 import BeautifulSoup
+import asyncio
+import concurrent.futures
+import copy
 import datetime as dt
-import requests
+import threading
+
+import html_parsers
+from http_client import HttpClient
+from refresh_policy import RefreshPolicy, lifetime_from_headers
+from single_flight import SingleFlight
+
+
+class NoDataError(Exception):
+    # Raised by refresh_if_needed() when there's nothing at all to show
+    pass
 
 
 
 class SegmentParent(ABC):
+
+    # HTTP client shared by every segment.  Created with default settings on
+    # first use, unless the main program has set one up already.
+    _http = None
+
+    # Keeps overlapping get_soup() calls for the same url down to one parse
+    _soup_flights = SingleFlight()
+
+    # Parser get_soup() uses, unless told otherwise (see html_parsers.py)
+    soup_parser = 'html.parser'
+
+    # Number of fetch() calls that failed (no response, server error, or the
+    # site's circuit breaker turned them away) since update_data() started
+    fetch_failures = 0
+
+    # Shortest lifetime, in seconds, of the pages fetched since update_data()
+    # started, going by their caching headers.  None if none of them said.
+    fetch_lifetime = None
+
+    # Decides when the data goes stale.  Segments can set their own, in the
+    # class or in __init__().
+    refresh_policy = RefreshPolicy()
+
+    # Whether refresh_data() can be run ahead of time in the background.
+    # Segments that would rather refresh in show() can set this to False.
+    prefetch = True
+
+    # Seconds on top of the HTTP timeouts to wait on a refresh, when there's
+    # no data to fall back on
+    REFRESH_MARGIN = 5
+
+    # What freshness() returns
+    FRESH = 'fresh'
+    STALE = 'stale'
+    EXPIRED = 'expired'
+
+    # Worker threads for refresh_if_needed()'s background refreshes, shared
+    # by all segments, and each segment's refresh in progress, plus the new
+    # data from a finished one, waiting for the next showing
+    _refresh_pool = None
+    _refresh_lock = threading.Lock()
+    # The main program's Prefetcher, if any, which then runs those
+    # refreshes instead of the pool
+    _prefetcher = None
+    _refreshing = None
+    _new_data = None
     
     def __init__(self, display, init, default_refresh=60):
         # Remember reference to main Display object, using "d" for brevity
@@ -37,26 +176,288 @@ class SegmentParent(ABC):
         if ref < 1:
             ref = 1
         self.refresh = dt.timedelta(minutes=ref)
+        # Stale data is still shown (while being refreshed) until it's this
+        # old, in minutes.  After that, showing it has to wait for a refresh.
+        self.expire = dt.timedelta(minutes=max(init.get('expire', ref * 4), ref))
+        # Most seconds show() will wait on a refresh, if there's any data at
+        # all to fall back on
+        self.deadline = init.get('deadline', 10)
+        # Any segment can be kept out of background refreshing in the config
+        self.prefetch = init.get('prefetch', self.prefetch)
         # Fetched data is eventually encapsulated into the 'data' instance
         # variable.  For now, we'll set it to None to indicate that we haven't
         # done any fetching yet...
         self.data = None
 
 
+    @property
+    def clock(self):
+        # Available even to segments that don't call SegmentParent.__init__()
+        return self.d.clock
+
+
     def data_is_stale(self):
         # Returns whether or not we need to refresh the data.
         # Depends on 'data', if it is not None, having a 'fetched_on' value
         # representing the datetime of most-recent refresh.
-        return self.data is None or dt.datetime.now() - self.data['fetched_on'] >= self.refresh
+        return self.data is None or self.clock.now() >= self.fresh_until()
+
+
+    def fresh_until(self):
+        return self.refresh_policy.fresh_until(self, self.data)
+
+
+    def freshness(self):
+        if self.data is None:
+            return self.EXPIRED
+        if not self.data_is_stale():
+            return self.FRESH
+        if self.clock.now() - self.fresh_until() >= self.expire - self.refresh:
+            return self.EXPIRED
+        return self.STALE
+
+
+    def refresh_if_needed(self, update_msg=None):
+        # Makes sure there's data to show, refreshing it first or in the
+        # background as needed (see above).  The update message, if any, is
+        # only shown if we have to wait.  Returns the freshness of the data
+        # we ended up with.  Raises NoDataError if there's none at all.
+        self.take_new_data()
+        state = self.freshness()
+        if state == self.FRESH:
+            return state
+        refreshing = self.refresh_in_background()
+        if state == self.STALE:
+            return state
+        if update_msg is not None:
+            self.d.print_update_msg(update_msg)
+        try:
+            refreshing.result(self.refresh_wait())
+        except concurrent.futures.TimeoutError:
+            pass
+        except Exception:
+            # update_data() only lets an error out when there was no data to
+            # keep.  Same as any other failed fetch, then.
+            self._note_fetch(1, None)
+        self.take_new_data()
+        if self.data is None:
+            self.data = self.stub_data()
+            if self.data is None:
+                raise NoDataError(f'No data for {type(self).__name__}')
+        return self.freshness()
+
+
+    def refresh_wait(self):
+        # Most seconds refresh_if_needed() waits on a refresh.  With nothing
+        # at all to show, that's about as long as one request could take.
+        if self.data is not None:
+            return self.deadline
+        connect, read = self.http_client().timeout
+        return connect + read + self.REFRESH_MARGIN
+
+
+    def stub_data(self):
+        # Placeholder data for when there's none at all (see above)
+        return None
+
+
+    def refresh_in_background(self):
+        # Starts refreshing the data on a worker thread, unless a refresh is
+        # already happening.  Returns the Future for the refresh.
+        prefetcher = SegmentParent._prefetcher
+        if prefetcher is not None:
+            future = prefetcher.refresh(self)
+            if future is not None:
+                return future
+        with SegmentParent._refresh_lock:
+            if SegmentParent._refresh_pool is None:
+                SegmentParent._refresh_pool = concurrent.futures.ThreadPoolExecutor(
+                    max_workers=4, thread_name_prefix='refresh')
+            pool = SegmentParent._refresh_pool
+        future, started = self.start_refresh(lambda: pool.submit(self._refresh_copy))
+        return future
+
+
+    def start_refresh(self, start):
+        # Calls start(), which should begin a refresh and return its Future,
+        # unless one's already running.  Returns the Future of the refresh in
+        # progress, and whether it was just started.
+        with SegmentParent._refresh_lock:
+            if self._refreshing is not None and not self._refreshing.done():
+                return self._refreshing, False
+            self._refreshing = start()
+            return self._refreshing, True
+
+
+    def offer_new_data(self, data):
+        # Called with the data from a finished background refresh.  It's
+        # swapped in by take_new_data().
+        with SegmentParent._refresh_lock:
+            self._new_data = data
 
 
-    def get_soup(self, url):
+    def take_new_data(self):
+        # Swaps in the newest data from a background refresh, if any.  Only
+        # called before a showing, never during one.
+        with SegmentParent._refresh_lock:
+            data, self._new_data = self._new_data, None
+        if data is not None:
+            self.data = data
+
+
+    def _refresh_copy(self):
+        # Refresh a copy of the segment, so show() can go on using the
+        # current data in the meantime, then hand the new data over
+        clone = copy.copy(self)
+        if clone.update_data():
+            self.offer_new_data(clone.data)
+
+
+    def refresh_due(self, lead):
+        # Returns whether the data is stale, or will be within timedelta
+        # 'lead' from now.  Not if there's new data waiting to be shown.
+        if self._new_data is not None:
+            return False
+        if self.data_is_stale():
+            return True
+        return self.clock.now() + lead >= self.fresh_until()
+
+
+    def refresh_data(self):
+        # Fetches new data into self.data.  Segments that fetch anything
+        # override either this or refresh_data_async().  If only the async
+        # one is overridden, this runs it to completion.
+        if not self.has_async_refresh():
+            raise NotImplementedError(f'{type(self).__name__} has no refresh_data()')
+        asyncio.run(self.refresh_data_async())
+
+
+    def update_data(self):
+        # Refreshes the data, unless a fetch fails, in which case we hang on
+        # to the last good data (if any) and try again next time.  Returns
+        # whether the refresh worked.
+        old_data = self.data
+        self.begin_update()
+        try:
+            self.refresh_data()
+        except Exception:
+            if old_data is None:
+                raise
+            self.data = old_data
+            return False
+        if not self.end_update(old_data):
+            self.data = old_data
+            return False
+        return True
+
+
+    def begin_update(self):
+        # Resets the fetch bookkeeping, before a refresh
+        self.fetch_failures = 0
+        self.fetch_lifetime = None
+
+
+    def end_update(self, old_data):
+        # Returns whether the refreshed data should be kept, and if so, notes
+        # how long the pages it came from are good for
+        if self.fetch_failures > 0 and old_data is not None:
+            return False
+        if self.fetch_lifetime is not None and isinstance(self.data, dict) and self.data is not old_data:
+            self.data['max_age'] = self.fetch_lifetime
+        return True
+
+
+    async def refresh_data_async(self):
+        # Coroutine version of refresh_data().  Unless overridden, runs
+        # refresh_data() in a worker thread.
+        await asyncio.to_thread(self.refresh_data)
+
+
+    @classmethod
+    def has_async_refresh(cls):
+        return cls.refresh_data_async is not SegmentParent.refresh_data_async
+
+
+    @classmethod
+    def fetches_data(cls):
+        # Whether the segment has data to refresh at all
+        return cls.refresh_data is not SegmentParent.refresh_data or cls.has_async_refresh()
+
+
+    @classmethod
+    def http_client(cls):
+        if SegmentParent._http is None:
+            SegmentParent._http = HttpClient()
+        return SegmentParent._http
+
+
+    @classmethod
+    def use_http_client(cls, client):
+        # Have all segments share the passed HttpClient
+        SegmentParent._http = client
+
+
+    @classmethod
+    def use_prefetcher(cls, prefetcher):
+        # Have refresh_in_background() go through the passed Prefetcher, so
+        # its per-source limits cover every refresh.  None to stop.
+        SegmentParent._prefetcher = prefetcher
+
+
+    def fetch(self, url, headers=None, max_bytes=None, stop=None):
+        # Returns a requests.Response for the passed url, or None if the
+        # request couldn't be made at all.  Check the status code!  The
+        # response's 'truncated' is True if max_bytes or stop cut it short.
+        response = self.http_client().fetch(url, headers, max_bytes, stop)
+        self._note_fetch(*self.fetch_outcome(response))
+        return response
+
+
+    @classmethod
+    def fetch_outcome(cls, response):
+        # Returns what a response adds to fetch_failures, and how many
+        # seconds its headers say it's good for (or None)
+        if response is None or response.status_code >= 500 or response.status_code == 429:
+            return 1, None
+        if response.status_code == 200:
+            return 0, lifetime_from_headers(response.headers)
+        return 0, None
+
+
+    def _note_fetch(self, failures, lifetime):
+        self.fetch_failures += failures
+        if lifetime is not None and (self.fetch_lifetime is None or lifetime < self.fetch_lifetime):
+            self.fetch_lifetime = lifetime
+
+
+    async def fetch_async(self, url, headers=None, max_bytes=None, stop=None):
+        # Same as fetch(), but can be awaited alongside other fetches.  The
+        # request itself is made in a worker thread.
+        return await asyncio.to_thread(self.fetch, url, headers, max_bytes, stop)
+
+
+    def get_soup(self, url, only=None, parser=None):
         # Returns a parsed BeautifulSoup object from passed url, or None
-        # if the HTTP request fails
-        response = requests.get(url, headers={'Cache-Control': 'no-cache'})
-        if response.status_code != 200:
-            return None
-        return BeautifulSoup(response.text, 'html.parser')
+        # if the HTTP request fails.  'only' limits the soup to the listed
+        # tags, and 'parser' overrides the segment's soup_parser.
+        if parser is None:
+            parser = self.soup_parser
+        only = html_parsers.normalize_filter(only)
+        key = (url, html_parsers.choose(parser, only), only)
+        soup, failures, lifetime = SegmentParent._soup_flights.do(key, self._get_soup_now, url, only, parser)
+        # Only one of the segments sharing the parse did the fetch, so each
+        # notes its outcome here for itself
+        self._note_fetch(failures, lifetime)
+        return soup
+
+
+    def _get_soup_now(self, url, only, parser):
+        # Returns the soup (or None), plus the fetch's outcome
+        response = self.http_client().fetch(url)
+        failures, lifetime = self.fetch_outcome(response)
+        if response is None or response.status_code != 200:
+            return None, failures, lifetime
+        return html_parsers.make_soup(response.text, parser, only), failures, lifetime
 
 
     @abstractmethod
@@ -70,13 +471,46 @@ class SegmentParent(ABC):
         pass
 
 
-    @abstractmethod
+    def render(self, fmt):
+        # Override to build and return a RenderPlan holding the segment's
+        # whole showing.  Gets the same format object as show().  Returning
+        # None (the default) means the segment uses show() instead.
+        # Typically, the child class will first call refresh_if_needed(),
+        # prior to building the plan.
+        return None
+
+
     def show(self, fmt):
-        # Called by the main program when it's the segment's turn to display
-        # A format object is always passed, although it will be None if no
-        # formatting is specified in the config object.
-        # Typically, the child class will first call data_is_stale() and
-        # refresh the data if needed, prior to showing anything.
-        pass
-        
+        # Called when it's the segment's turn to display, if render() doesn't
+        # return a plan.  A format object is always passed, although it will
+        # be None if no formatting is specified in the config object.
+        # Typically, the child class will first call refresh_if_needed(),
+        # prior to showing anything.
+        # Segments that override render() don't need to override this.
+        plan = self.render(fmt)
+        if plan is None:
+            raise NotImplementedError(f'{type(self).__name__} must override show() or render()')
+        self.d.play(plan)
 
+
+    def play(self, fmt, time_left=None):
+        # Called by the main program.  Returns the plan that was played, or
+        # None if the segment showed itself with show() or was skipped.
+        # With time_left (seconds), a plan that wouldn't finish in time
+        # isn't played at all.  (A show() can't be timed ahead, so it always
+        # goes on.)
+        self.take_new_data()
+        try:
+            plan = self.render(fmt)
+            if plan is None:
+                self.show(fmt)
+            elif time_left is not None and plan.duration() > time_left:
+                return None
+            else:
+                self.d.play(plan)
+        except NoDataError:
+            # Nothing fetched yet, and no stub.  Try again next time around.
+            self.d.print('No data available yet')
+            self.d.newline()
+            return None
+        return plan
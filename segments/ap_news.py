@@ -10,6 +10,11 @@
 #   - Initialization parameters:
 #
 #       refresh     Minutes to wait between webscrapes (default=30, min=1).
+#       max_stories Stop reading the page after this many stories
+#                   (default=40).  Saves downloading (and holding in memory)
+#                   the rest of a big page.
+#       max_bytes   Most bytes of the page to read, no matter what
+#                   (default=3,000,000)
 #
 #
 #   - Format parameters:
@@ -36,8 +41,6 @@
 
 
 
-import datetime as dt
-import requests
 from segment_parent import SegmentParent
 
 
@@ -45,6 +48,8 @@ class Segment(SegmentParent):
 
     def __init__(self, display, init):
         super().__init__(display, init, default_refresh=30)
+        self.max_stories = init.get('max_stories', 40)
+        self.max_bytes = init.get('max_bytes', 3_000_000)
 
 
     def show_intro(self):
@@ -75,14 +80,17 @@ class Segment(SegmentParent):
     
     
     def refresh_data(self):
-        self.data = {'fetched_on':dt.datetime.now(),
+        self.data = {'fetched_on':self.clock.now(),
                      'item_index':0,
                      'items':[],
                     }
         url = 'https://apnews.com'
-        # We won't use BeautifulSoup -- Just munge the source directly
-        response = requests.get(url, headers={'Cache-Control': 'no-cache'})
-        if response.status_code == 200:
+        # We won't use BeautifulSoup -- Just munge the source directly.
+        # Each story starts with a "firstWords" key, so once we've seen one
+        # more of those than we want, we have all the stories we want.
+        response = self.fetch(url, max_bytes=self.max_bytes,
+                              stop=['"firstWords":'] * (self.max_stories + 1))
+        if response is not None and response.status_code == 200:
             split_source = response.text.split('"firstWords":')
             for chunk in split_source:
                 headline = self.get_headline(chunk)
@@ -101,9 +109,7 @@ class Segment(SegmentParent):
         headlines = fmt.get('headlines', False)
         
         # Refresh?
-        if self.data_is_stale():
-            self.d.print_update_msg('Getting Latest News')
-            self.refresh_data()
+        self.refresh_if_needed('Getting Latest News')
 
         # Show header and set up start and end indices, based on headlines
         if headlines:
@@ -4,12 +4,13 @@
 #
 #   - Basic example of a segment class
 #   - Takes no initialization parameters, but does allow for a few formats
+#   - Builds a RenderPlan in render() rather than printing in show()
 #
 #   Jeff Jetton, Jan-Feb 2023
 #
 ################################################################################
 
-import datetime as dt
+from render_plan import RenderPlan
 from segment_parent import SegmentParent
 
 
@@ -23,7 +24,8 @@ class Segment(SegmentParent):
         #      done for the life of this object
         #    - Parameters dealing with formatting the data, which could change
         #      across different showings of the segment, but don't change the
-        #      underlying data, should be used with the show() method, not here
+        #      underlying data, should be used with the render() or show()
+        #      method, not here
         #    - Even if the segment requires no initialization, RetroFeed will
         #      still pass it an empty dictionary, so allow for it!
         #    - The expected keys may or may not be in the init dictionary,
@@ -48,21 +50,26 @@ class Segment(SegmentParent):
         pass
 
 
-    def show(self, fmt):
-        # All segments must have a show() method, which is called by
-        # retrofeed.py when the segment comes up next in the playlist
+    def render(self, fmt):
+        # All segments must have either a show() or a render() method.  Both
+        # are handed the same formatting info when the segment comes up next
+        # in the playlist, but rather than printing, render() returns a
+        # RenderPlan with the whole showing laid out ahead of time.  The
+        # Display then plays it back at the usual pace.
         #    - Method will be passed a dictionary of formatting parameters
         #    - Even if no formatting requested or needed, it will still
         #      get an empty dictionary
         #    - As with __init__(), the expected keys may not exists,
         #      nor might they have expected values if they do... be careful!
+        #    - A RenderPlan has the same print(), newline(), wait_beats(),
+        #      and print_header() methods as the Display
 
         # Always check for missing/wrong format info and provide sensible defaults
         fmt = fmt.get('format', 'long')
         if fmt not in ('long', 'short', 'longdate', 'longtime', 'shortdate', 'shorttime'):
             fmt = 'long'
 
-        now = dt.datetime.now()
+        now = self.clock.now()
 
         # The Display object comes with some handy date/time formatters
         # By default, fmt_time_text() heeds 12/24hr preference specified
@@ -71,21 +78,18 @@ class Segment(SegmentParent):
         time_text = self.d.fmt_time_text(now)
         date_long = ('It is ' + date_text)
         time_long = ('Current time is ' + time_text)
-        
+
+        plan = RenderPlan(self.d)
         if fmt == 'long':
-            self.d.print(date_long)
+            plan.print(date_long)
         if fmt == 'long' or fmt == 'longtime':
-            self.d.print(time_long)
-            return
-        if fmt == 'short':
-            self.d.print(time_text + ', ' + date_text)
-            return
-        if fmt == 'longdate':
-            self.d.print(date_long)
-            return
-        if fmt == 'shortdate':
-            self.d.print(date_text)
-            return
-        if fmt == 'shorttime':
-            self.d.print(time_text)
-
+            plan.print(time_long)
+        elif fmt == 'short':
+            plan.print(time_text + ', ' + date_text)
+        elif fmt == 'longdate':
+            plan.print(date_long)
+        elif fmt == 'shortdate':
+            plan.print(date_text)
+        elif fmt == 'shorttime':
+            plan.print(time_text)
+        return plan
@@ -5,6 +5,7 @@
 #   Very basic example of a segment class
 #
 #   - Takes no initialization, takes no formatting
+#   - Lays out its whole showing ahead of time as a RenderPlan
 #   - Creates a series of pseudorandom numbers based on the computer's MAC
 #     address and the current local date, so you get the same lucky numbers
 #     everytime you use this on a given day, but usually different from numbers
@@ -20,6 +21,7 @@
 
 import datetime as dt
 import random
+from render_plan import RenderPlan
 from segment_parent import SegmentParent
 import uuid
 
@@ -52,7 +54,7 @@ class Segment(SegmentParent):
 
     def get_lucky_numbers(self):
         # Get the number of days since Jan 1, 1970 (local)
-        days = (dt.datetime.now() - dt.datetime(1970,1,1)).days
+        days = (self.clock.now() - dt.datetime(1970,1,1)).days
         # Get MAC address
         mac = uuid.getnode()
         # Build today's seed from those two things
@@ -71,23 +73,25 @@ class Segment(SegmentParent):
         return sorted
 
 
-    def show(self, fmt):
-        # All segments must have a show() method, which is called by
-        # retrofeed.py when the segment comes up next in the playlist.
+    def render(self, fmt):
+        # Segments need either a show() or a render() method, which is called
+        # by retrofeed.py when the segment comes up next in the playlist.
+        # render() builds a RenderPlan with the same print()/wait_beats()/etc.
+        # calls you'd make on the Display, and returns it to be played.
         # We're not providing any special formatting options, so we ignore fmt
         nums = self.get_lucky_numbers()
-        self.d.print("Your Lucky Numbers for Today:")
-        self.d.print('  ', end='')
+        plan = RenderPlan(self.d)
+        plan.print("Your Lucky Numbers for Today:")
+        plan.print('  ', end='')
         for i, num in enumerate(nums):
-            self.d.print(f'{num} ', end='')
+            plan.print(f'{num} ', end='')
             if i == 4:
                 # Build suspense!
-                self.d.print('and', end='')
+                plan.print('and', end='')
                 for j in range(3):
-                    self.d.wait_beats()
-                    self.d.print('.', end='')
-                self.d.wait_beats()
-                self.d.print(' ', end='')
-        self.d.newline()
-
-
+                    plan.wait_beats()
+                    plan.print('.', end='')
+                plan.wait_beats()
+                plan.print(' ', end='')
+        plan.newline()
+        return plan
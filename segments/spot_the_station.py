@@ -38,6 +38,10 @@ from segment_parent import SegmentParent
 
 
 class Segment(SegmentParent):
+
+    # All we look at on the page, so all get_soup() needs to build
+    soup_parser = 'fast'
+    page_tags = [('div', {'id':'widget_info'})]
                   
     def __init__(self, display, init):
         super().__init__(display, init, default_refresh=(24*60))
@@ -59,7 +63,7 @@ class Segment(SegmentParent):
 
     def parse_one_sighting(self, raw_text):
         # Figure out current UTC offset from localtime
-        utc_diff = dt.datetime.utcnow() - dt.datetime.now()
+        utc_diff = self.clock.utcnow() - self.clock.now()
         # Data is comma-delimited within the raw text
         fields = raw_text.split(',')
         # Only proceed if we have the right number of fields
@@ -102,9 +106,9 @@ class Segment(SegmentParent):
 
     def refresh_data(self):
         url = f'https://spotthestation.nasa.gov/sightings/view.cfm?country={self.country}&region={self.region}&city={self.city}'
-        soup = self.get_soup(url)
+        soup = self.get_soup(url, only=self.page_tags)
         if soup is not None:
-            self.data = {'fetched_on': dt.datetime.now()}
+            self.data = {'fetched_on': self.clock.now()}
             self.data['sightings'] = self.parse_sightings(soup)
 
 
@@ -113,9 +117,7 @@ class Segment(SegmentParent):
         max_sightings = fmt.get('max_sightings', 3)
         if max_sightings < 0:
             max_sightings = 0
-        if self.data_is_stale():
-            self.d.print_update_msg('Updating Station Data')
-            self.refresh_data()
+        self.refresh_if_needed('Updating Station Data')
 
         self.d.print_header('Spot the Station', '>', '<')
         self.d.newline()
@@ -129,7 +131,7 @@ class Segment(SegmentParent):
         self.d.print('Upcoming ISS Sightings:')
         
         num_shown = 0
-        cutoff_dt = dt.datetime.now() - dt.timedelta(minutes=5)
+        cutoff_dt = self.clock.now() - dt.timedelta(minutes=5)
         for s in self.data['sightings']:
             if s['date_time'] >= cutoff_dt and num_shown < max_sightings:
                 self.d.newline(self.d.beat_delay)
@@ -16,7 +16,6 @@
 #
 ################################################################################
 
-import datetime as dt
 from segment_parent import SegmentParent
 
 
@@ -35,20 +34,28 @@ class Segment(SegmentParent):
 
     
     def refresh_data(self):
-        self.data = {'fetched_on':dt.datetime.now(),
+        self.data = {'fetched_on':self.clock.now(),
                      }
         # Do fetching here (webscraping, RSS, API, file read, etc.)
         # For now, we'll just assign a string constant and imagine we did
         # something fancier...
         self.data['message'] = 'hello, world'
 
+    # If you're fetching from several places, you can instead write the
+    # refresh as a coroutine and make the requests all at once:
+    #
+    # async def refresh_data_async(self):
+    #     urls = ['https://example.com/a', 'https://example.com/b']
+    #     responses = await asyncio.gather(*[self.fetch_async(u) for u in urls])
+    #     self.data = {'fetched_on':self.clock.now(),
+    #                  'pages':[r.text for r in responses if r is not None],
+    #                 }
+
 
 
     def show(self, fmt):
         # Refresh if needed
-        if self.data_is_stale():
-            self.d.print_update_msg('Updating Data')
-            self.refresh_data()
+        self.refresh_if_needed('Updating Data')
 
         self.d.print_header('Template', '=')
         self.d.newline()
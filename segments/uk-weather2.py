@@ -10,6 +10,10 @@
 #                  the weather will always be refreshed when the "last update"
 #                  of the last fetch is a bit more than an hour old.  Use this
 #                  refresh time to get more-frequent forecast updates if wanted.
+#                  Once we know when the forecast we have was issued, though,
+#                  the next fetch waits until shortly after the next one is
+#                  due out (they come hourly), and this is only used if that
+#                  one's late.
 #       lat, lon   Latitude amd longitude of weather/forecast location, used to 
 #                  get data from weather.gov website.  (If either are missing,
 #                  both default to lat 36.116453, lon -86.675228)
@@ -43,7 +47,7 @@
 
 from datetime import datetime as dt, time
 import json
-import urllib.request
+from refresh_policy import ForecastIssueRefresh
 from segment_parent import SegmentParent
 
 
@@ -51,6 +55,8 @@ class Segment(SegmentParent):
     # Redefine this so that any UK location can be provided in the CONFIG and it is searched, otherwise London is provided
     def __init__(self, display, init):
         super().__init__(display, init, default_refresh=20)
+        # Forecasts are issued hourly, so fetch again once the next is out
+        self.refresh_policy = ForecastIssueRefresh()
         # Set the ID from the API based on the location provided
         self.location = init.get('location', None)
         if self.location == "Durham":
@@ -66,6 +72,19 @@ class Segment(SegmentParent):
     def show_intro(self):
         self.d.print('Weather provided by metoffice.gov.uk')
 
+
+    @classmethod
+    def issue_time(cls, s):
+        # Converts DataPoint's "dataDate" UTC text (such as
+        # '2023-04-07T14:00:00Z') into a naive local datetime
+        if s is None:
+            return None
+        try:
+            return dt.strptime(s, '%Y-%m-%dT%H:%M:%S%z').astimezone().replace(tzinfo=None)
+        except ValueError:
+            return None
+
+
     def assign_na(self):
         # Assign the variables we are interested in
         self.data["Temperature"] = "N/A"
@@ -79,19 +98,37 @@ class Segment(SegmentParent):
         self.data["Visability"] = "N/A"
         self.data["Max UV"] = "N/A"
 
+    def stub_data(self):
+        # Everything show() reads, for when there's no forecast to be had
+        return {'fetched_on':self.clock.now(),
+                'periods':[],
+                'hazards':[],
+                'last_update':'N/A',
+                'currently':'N/A',
+                'temp_f':'N/A',
+                'temp_c':'N/A',
+                'wind_speed':'N/A',
+                'visibility':'N/A',
+                'dewpoint':'N/A',
+                'comfort':'',
+               }
+
+
 # Work in refreshing the data later on
     def refresh_data(self):
-        self.data = {'fetched_on':dt.datetime.now(),
-                     'periods':[],
-                     'hazards':[]}
+        self.data = self.stub_data()
 
         # Load the correct data
         url = f"http://datapoint.metoffice.gov.uk/public/data/val/wxfcs/all/json/{self.id}?res=3hourly&key=53d263d4-fd13-4f65-a707-b7265601b092"
-        response = urllib.request.urlopen(url)
-        weather_data = (response.read()).decode("utf-8")
+        response = self.fetch(url)
+        if response is None or response.status_code != 200:
+            return
         
         # Convert the data to a dictionary
-        weather = json.loads(weather_data)
+        weather = json.loads(response.text)
+
+        # When this forecast was issued, so we know when to expect the next
+        self.data['issued_at'] = self.issue_time(weather["SiteRep"]["DV"].get("dataDate"))
 
         # Collect the data for the current day
         date0 = weather["SiteRep"]["DV"]["Location"]["Period"][0]["value"]
@@ -356,9 +393,7 @@ class Segment(SegmentParent):
         if forecast_periods < 0:
             forecast_periods = 0
 
-        if self.data_is_stale():
-            self.d.print_update_msg('Checking for Weather Updates')
-            self.refresh_data()
+        self.refresh_if_needed('Checking for Weather Updates')
 
         self.d.print(f'Weather at {self.location}')
         self.d.print(f'As of {self.data["last_update"]}')
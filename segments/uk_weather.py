@@ -10,6 +10,10 @@
 #                  the weather will always be refreshed when the "last update"
 #                  of the last fetch is a bit more than an hour old.  Use this
 #                  refresh time to get more-frequent forecast updates if wanted.
+#                  Once we know when the forecast we have was issued, though,
+#                  the next fetch waits until shortly after the next one is
+#                  due out (they come hourly), and this is only used if that
+#                  one's late.
 #       lat, lon   Latitude amd longitude of weather/forecast location, used to 
 #                  get data from weather.gov website.  (If either are missing,
 #                  both default to lat 36.116453, lon -86.675228)
@@ -41,9 +45,9 @@
 # http://datapoint.metoffice.gov.uk/public/data/val/wxfcs/all/xml/351290/?res=3hourly&key=53d263d4-fd13-4f65-a707-b7265601b092
 # The predicted forecast every 3 hours within a day, starting at 0 to 21 hrs of the day
 
-from datetime import datetime as dt, time
+from datetime import datetime as dt, time, timedelta
 import json
-import urllib.request
+from refresh_policy import ForecastIssueRefresh
 from segment_parent import SegmentParent
 
 
@@ -55,6 +59,8 @@ class Segment(SegmentParent):
     # Redefine this so that any UK location can be provided in the CONFIG and it is searched, otherwise London is provided
     def __init__(self, display, init):
         super().__init__(display, init, default_refresh=20)
+        # Forecasts are issued hourly, so fetch again once the next is out
+        self.refresh_policy = ForecastIssueRefresh()
         # Set the ID from the API based on the location provided
         self.location = init.get('location', None)
         if self.location == "Durham":
@@ -71,6 +77,18 @@ class Segment(SegmentParent):
         self.d.print('Weather provided by metoffice.gov.uk')
 
 
+    @classmethod
+    def issue_time(cls, s):
+        # Converts DataPoint's "dataDate" UTC text (such as
+        # '2023-04-07T14:00:00Z') into a naive local datetime
+        if s is None:
+            return None
+        try:
+            return dt.strptime(s, '%Y-%m-%dT%H:%M:%S%z').astimezone().replace(tzinfo=None)
+        except ValueError:
+            return None
+
+
 # CONTINUE FROM HERE ...
 
     # @classmethod
@@ -88,7 +106,7 @@ class Segment(SegmentParent):
     #         return 'Very Humid'
     #     return 'Oppressive'
     @classmethod
-    def humidity(cls, humidity_text)
+    def humidity(cls, humidity_text):
         humid = int(humidity_text.split)
         dp = int()
 
@@ -142,20 +160,38 @@ class Segment(SegmentParent):
     #         dt_object = dt.datetime.strptime(dt_string, '%Y %d %b %I:%M %p').astimezone()
     #     return dt_object
 
+    def stub_data(self):
+        # Everything show() reads, for when there's no forecast to be had
+        return {'fetched_on':self.clock.now(),
+                'periods':[],
+                'hazards':[],
+                'last_update':'N/A',
+                'currently':'N/A',
+                'temp_f':'N/A',
+                'temp_c':'N/A',
+                'wind_speed':'N/A',
+                'visibility':'N/A',
+                'dewpoint':'N/A',
+                'comfort':'',
+               }
+
+
 # Work in refreshing the data later on
     def refresh_data(self):
-        self.data = {'fetched_on':dt.datetime.now(),
-                     'periods':[],
-                     'hazards':[]}
+        self.data = self.stub_data()
 
         # Load the correct data
         # url = f'https://forecast.weather.gov/MapClick.php?lat={self.lat}&lon={self.lon}'
         url = f"http://datapoint.metoffice.gov.uk/public/data/val/wxfcs/all/json/{self.id}?res=3hourly&key=53d263d4-fd13-4f65-a707-b7265601b092"
-        response = urllib.request.urlopen(url)
-        weather_data = (response.read()).decode("utf-8")
+        response = self.fetch(url)
+        if response is None or response.status_code != 200:
+            return
         
         # Convert the data to a dictionary
-        weather = json.loads(weather_data)
+        weather = json.loads(response.text)
+
+        # When this forecast was issued, so we know when to expect the next
+        self.data['issued_at'] = self.issue_time(weather["SiteRep"]["DV"].get("dataDate"))
 
         # Collect the data for the current day
         date0 = weather["SiteRep"]["DV"]["Location"]["Period"][0]
@@ -200,7 +236,7 @@ class Segment(SegmentParent):
         UVArray.clear()
 
         # Provide all the information for tomorrow if it is the evening
-        current_time = dt.utcnow().time()
+        current_time = self.clock.utcnow().time()
         if current_time > time(18,00):
             for i in weather["SiteRep"]["DV"]["Location"]["Period"][1]["Rep"]:
                 timeArray.append(i["$"])
@@ -319,8 +355,8 @@ class Segment(SegmentParent):
             return True
         else:
             # Data is always stale if (slightly) more than an hour has gone by
-            now = dt.datetime.now()
-            return 'last_update_dt' in self.data and now.astimezone() - self.data['last_update_dt'] >= dt.timedelta(minutes=62)
+            now = self.clock.now()
+            return 'last_update_dt' in self.data and now.astimezone() - self.data['last_update_dt'] >= timedelta(minutes=62)
 
 
 
@@ -329,9 +365,7 @@ class Segment(SegmentParent):
         if forecast_periods < 0:
             forecast_periods = 0
 
-        if self.data_is_stale():
-            self.d.print_update_msg('Checking for Weather Updates')
-            self.refresh_data()
+        self.refresh_if_needed('Checking for Weather Updates')
 
         self.d.print(f'Weather at {self.location}')
         self.d.print(f'As of {self.data["last_update"]}')
@@ -16,9 +16,7 @@
 #
 ################################################################################
 
-from bs4 import BeautifulSoup
-import datetime as dt
-import requests
+import html_parsers
 from segment_parent import SegmentParent
 
 
@@ -45,26 +43,27 @@ class Segment(SegmentParent):
 
 
     def refresh_data(self):
-        self.data = {'fetched_on':dt.datetime.now(),
+        self.data = {'fetched_on':self.clock.now(),
                      'item_index':0,
                      'items':[]
                     }
-        today = dt.date.today()
+        today = self.clock.today()
         # For debugging...
-        #today = dt.date(2023, 3, 11)
+        #today = self.clock.today().replace(month=3, day=11)
         # Format as full month plus day-of-month w/o leading zero
         self.data['today'] = today.strftime('%B %d').replace(' 0', ' ')
         url = 'https://en.wikipedia.org/wiki/Wikipedia:Selected_anniversaries/'
         today_formatted = self.data['today'].replace(' ', '_')
         url += today_formatted
-        # Get raw source first
-        response = requests.get(url, headers={'Cache-Control': 'no-cache'})
-        if response.status_code != 200:
-            return
         # Split it on "today" page links
         link = f"<a href=\"/wiki/{today_formatted}\" title=\"{self.data['today']}\">{self.data['today']}</a>"
+        # Get raw source first.  We only want the first list after the
+        # second link, so stop reading once we've got to the end of that.
+        response = self.fetch(url, stop=[link, link, '</ul>'])
+        if response is None or response.status_code != 200:
+            return
         # Get each list found in the third chunk
-        soup = BeautifulSoup(response.text.split(link)[2], 'html.parser')
+        soup = html_parsers.make_soup(response.text.split(link)[2], 'fast', only=['ul'])
         lists = soup.find_all('ul')
         # First list only, for now (the birth/death list often has obscure names)
         self.parse_list(lists[0])
@@ -77,9 +76,7 @@ class Segment(SegmentParent):
         if items_to_show < 0:
             items_to_show = 1
         # Refresh if needed
-        if self.data_is_stale():
-            self.d.print_update_msg('Consulting Wikipedia')
-            self.refresh_data()
+        self.refresh_if_needed('Consulting Wikipedia')
         # Header
         self.d.print_header(self.data['today'] + ': On This Day', '-')
         self.d.newline()
@@ -6,8 +6,12 @@
 #
 #   - Initialization parameters:
 #
-#       refresh     Minutes to wait between webscrapes (default=15, min=1)
-#       TODO: closed_refresh
+#       refresh         Minutes to wait between webscrapes while the market
+#                       is open (default=15, min=1).  There's always a fresh
+#                       scrape just after the open and the close, and none
+#                       in between while the market's closed.
+#       holidays        List of 'YYYY-MM-DD' dates the market is closed on
+#                       a weekday (default=none)
 #
 #   - Format parameters:  none
 #
@@ -17,8 +21,7 @@
 ################################################################################
 
 
-
-import datetime as dt
+from refresh_policy import MarketHoursRefresh
 from segment_parent import SegmentParent
 
 
@@ -29,9 +32,14 @@ class Segment(SegmentParent):
                '^IXIC':'NASDAQ',
                '^RUT' :'Russell'
               }
+
+    # All we look at on the page, so all get_soup() needs to build
+    soup_parser = 'fast'
+    page_tags = ['fin-streamer', ('span', {'data-id':'mk-msg'})]
     
     def __init__(self, display, init):
         super().__init__(display, init, default_refresh=15)
+        self.refresh_policy = MarketHoursRefresh(holidays=init.get('holidays', ()))
 
 
     def show_intro(self):
@@ -54,12 +62,14 @@ class Segment(SegmentParent):
                 i = {'symbol':symbol, 'price':'N/A', 'delta':'N/A', 'delta_pct':'N/A'}
                 curr_symbol = symbol
             # Check for price
+            # (As plain strings, not bits of the soup, which drag the whole
+            # tree along with them)
             if s['data-field'] == 'regularMarketPrice':
-                i['price'] = s.contents[0]
+                i['price'] = str(s.contents[0])
             elif s['data-field'] == 'regularMarketChange':
-                i['delta'] = s.contents[0].contents[0]
+                i['delta'] = str(s.contents[0].contents[0])
             elif s['data-field'] == 'regularMarketChangePercent':
-                i['delta_pct'] = s.contents[0].contents[0]
+                i['delta_pct'] = str(s.contents[0].contents[0])
         # Append last index
         ind.append(i)
         return ind
@@ -79,11 +89,11 @@ class Segment(SegmentParent):
 
     
     def refresh_data(self):
-        self.data = {'fetched_on':dt.datetime.now(),
+        self.data = {'fetched_on':self.clock.now(),
                      'market_message':'',
                      'indexes':[],
                     }
-        soup = self.get_soup('https://finance.yahoo.com')
+        soup = self.get_soup('https://finance.yahoo.com', only=self.page_tags)
         if soup is None:
             return
         msg = soup.find('span', {'data-id':'mk-msg'})
@@ -97,9 +107,7 @@ class Segment(SegmentParent):
 
     def show(self, fmt):
         # Check for need to refresh
-        if self.data_is_stale():
-            self.d.print_update_msg('Updating Financial Data')
-            self.refresh_data()
+        self.refresh_if_needed('Updating Financial Data')
 
         self.d.print_header('Stocks', '$')
         self.d.newline()
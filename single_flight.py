@@ -0,0 +1,70 @@
+################################################################################
+#
+#   Single Flight Class
+#
+#   Makes sure only one call for the same thing is ever running at a time.
+#   If a second thread asks for a key that's already being worked on, it
+#   just waits for that call to finish and gets the same result (or the same
+#   exception) rather than doing all the work again.
+#
+#   Used by HttpClient, so two segments (or two background refreshes)
+#   wanting the same page at the same moment share one request, and by
+#   SegmentParent.get_soup(), so they share one parse, too.  The shared
+#   result is the very same object for everyone, so treat it as read-only.
+#
+################################################################################
+
+import threading
+
+
+class _Call:
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+
+class SingleFlight:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.calls = 0
+        self.shared = 0
+
+
+    def do(self, key, func, *args, **kwargs):
+        # Returns func(*args, **kwargs), unless a call for key is already
+        # running, in which case returns whatever that one does
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = _Call()
+                self._calls[key] = call
+                self.calls += 1
+                leader = True
+            else:
+                self.shared += 1
+                leader = False
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = func(*args, **kwargs)
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+
+    def stats(self):
+        with self._lock:
+            return {'calls':self.calls, 'shared':self.shared, 'in_flight':len(self._calls)}
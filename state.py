@@ -0,0 +1,139 @@
+################################################################################
+#
+#   State Store Class
+#
+#   Saves every segment's 'data' to disk now and then, and when RetroFeed
+#   shuts down, so that after a restart (or the power getting yanked) the
+#   segments pick up where they left off:  same fetched data, same place in
+#   their rotation of news items, etc.  Each segment's own data_is_stale()
+#   then decides what really needs fetching again.
+#
+#   - Saved with pickle, to a temporary file that then replaces the old one,
+#     so there's always a complete snapshot on disk, old or new
+#   - Each segment's data is pickled on its own.  One that can't be is left
+#     out (and logged) rather than losing the whole snapshot.
+#   - A snapshot from a different version of RetroFeed is ignored, since the
+#     segments' data may not look the same anymore
+#   - A segment's saved data is only restored if the segment is still set up
+#     the same way in the config (same module and settings), and if its
+#     'fetched_on' time isn't in the future.  (A Pi has no clock battery, so
+#     until it gets the time from the network it may think it's last week.)
+#
+#   Settings, from the 'state' table of the config (all optional):
+#
+#       enabled     True/False (default = True)
+#       file        Path of the snapshot (default = 'retrofeed_state.pickle'
+#                   in the RetroFeed directory)
+#       interval    Seconds between saves (default = 300)
+#
+#   The file is only ever read back by RetroFeed itself.  Don't point it at
+#   a pickle you got from somewhere else!
+#
+#   Used by retrofeed.py.
+#
+################################################################################
+
+import logging
+import os
+import pickle
+
+from clock import Clock
+
+
+class StateStore:
+
+    # Bump whenever the layout of the snapshot itself changes
+    FORMAT = 2
+
+    def __init__(self, settings, version, segment_config, clock=None):
+        default_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'retrofeed_state.pickle')
+        self.path = settings.get('file', default_file)
+        self.interval = settings.get('interval', 300)
+        self.version = version
+        self.segment_config = segment_config
+        self._clock = clock if clock is not None else Clock()
+        self._next_save = self._clock.monotonic() + self.interval
+        # Keys of the segments left out of the last save
+        self.skipped = []
+
+
+    def fingerprint(self, key):
+        # Stands in for a segment's config, to tell whether it's changed
+        return repr(sorted(self.segment_config.get(key, {}).items()))
+
+
+    def save(self, segments):
+        snapshot = {'format':self.FORMAT,
+                    'version':self.version,
+                    'saved_at':self._clock.now(),
+                    'segments':{},
+                   }
+        self.skipped = []
+        for key, segment in segments.items():
+            data = getattr(segment, 'data', None)
+            if data is None:
+                continue
+            try:
+                data = pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL)
+            except Exception as e:
+                # Anything from an open file to a RecursionError from a bit
+                # of soup left in the data
+                logging.getLogger(__name__).warning('Not saving data for segment %s: %r', key, e)
+                self.skipped.append(key)
+                continue
+            snapshot['segments'][key] = {'config':self.fingerprint(key), 'data':data}
+        temp_path = self.path + '.tmp'
+        try:
+            with open(temp_path, 'wb') as f:
+                pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, self.path)
+        except Exception as e:
+            # Nowhere to write it, most likely.  Not worth stopping the feed
+            # over.
+            logging.getLogger(__name__).warning('Could not save state to %s: %r', self.path, e)
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            return False
+        self._next_save = self._clock.monotonic() + self.interval
+        return True
+
+
+    def save_if_due(self, segments):
+        if self._clock.monotonic() >= self._next_save:
+            self.save(segments)
+
+
+    def load(self, segments):
+        # Restores saved data into the passed segments.  Returns the keys of
+        # the segments that got their data back.
+        try:
+            with open(self.path, 'rb') as f:
+                snapshot = pickle.load(f)
+        except FileNotFoundError:
+            return []
+        except Exception:
+            # Corrupt or from who-knows-where.  Start fresh.
+            return []
+        if not isinstance(snapshot, dict) or snapshot.get('format') != self.FORMAT \
+           or snapshot.get('version') != self.version:
+            return []
+        now = self._clock.now()
+        restored = []
+        for key, saved in snapshot.get('segments', {}).items():
+            if key not in segments or not hasattr(segments[key], 'data'):
+                continue
+            if saved.get('config') != self.fingerprint(key):
+                continue
+            try:
+                data = pickle.loads(saved.get('data'))
+            except Exception:
+                continue
+            if isinstance(data, dict) and 'fetched_on' in data and data['fetched_on'] > now:
+                continue
+            segments[key].data = data
+            restored.append(key)
+        return restored
@@ -0,0 +1,6 @@
+# RetroFeed's modules import each other from the top directory, the same as
+# when retrofeed.py runs, so the tests need it on the path too
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,132 @@
+import pytest
+
+from outputs.framebuffer import Output
+
+
+FG = '#ffffff'
+BG = '#000080'
+
+
+@pytest.fixture
+def fb_file(tmp_path):
+    # An empty file, which the output grows to the framebuffer's size
+    path = tmp_path / 'fb'
+    path.write_bytes(b'')
+    return str(path)
+
+
+def make(fb_file, height=2, width=4, **init):
+    init = dict({'device':fb_file, 'fb_width':64, 'fb_height':32, 'bits_per_pixel':32,
+                 'foreground':FG, 'background':BG}, **init)
+    return Output(height, width, init)
+
+
+def pixel_at(output, x, y):
+    with open(output.device, 'rb') as f:
+        data = f.read()
+    pos = y * output.stride + x * output.bytes_per_pixel
+    return data[pos:pos + output.bytes_per_pixel]
+
+
+def test_text_area_is_centered(fb_file):
+    output = make(fb_file)
+    try:
+        # 4x2 characters of 8x8 pixels, in a 64x32 framebuffer
+        assert (output.origin_x, output.origin_y) == (16, 8)
+    finally:
+        output.close()
+
+
+def test_glyph_pixels(fb_file):
+    output = make(fb_file)
+    try:
+        fg, bg = output.pixel(FG), output.pixel(BG)
+        output.write('-')
+        # The built-in '-' is a five-pixel bar, one pixel in from the left,
+        # on the glyph's fourth row
+        y = output.origin_y + 3
+        assert pixel_at(output, output.origin_x, y) == bg
+        for x in range(1, 6):
+            assert pixel_at(output, output.origin_x + x, y) == fg
+        assert pixel_at(output, output.origin_x + 6, y) == bg
+        assert pixel_at(output, output.origin_x + 3, y - 1) == bg
+        # Outside the text area, just background
+        assert pixel_at(output, 0, 0) == bg
+        assert output.snapshot()[0] == '-   '
+    finally:
+        output.close()
+
+
+def test_scroll_moves_pixels_up(fb_file):
+    output = make(fb_file)
+    try:
+        fg, bg = output.pixel(FG), output.pixel(BG)
+        x = output.origin_x + 3
+        output.write('\n-')
+        assert pixel_at(output, x, output.origin_y + 8 + 3) == fg
+        output.write('\n')
+        assert pixel_at(output, x, output.origin_y + 3) == fg
+        assert pixel_at(output, x, output.origin_y + 8 + 3) == bg
+    finally:
+        output.close()
+
+
+def test_scale(fb_file):
+    output = make(fb_file, height=1, width=2, scale=2)
+    try:
+        fg = output.pixel(FG)
+        output.write('-')
+        y = output.origin_y + 3 * 2
+        assert pixel_at(output, output.origin_x + 2, y) == fg
+        assert pixel_at(output, output.origin_x + 2, y + 1) == fg
+        assert pixel_at(output, output.origin_x + 11, y) == fg
+    finally:
+        output.close()
+
+
+def test_16_bit_pixels(fb_file):
+    output = make(fb_file, bits_per_pixel=16)
+    try:
+        assert output.pixel('#ff0000') == b'\x00\xf8'
+        assert output.pixel('#00ff00') == b'\xe0\x07'
+        assert output.pixel('#0000ff') == b'\x1f\x00'
+    finally:
+        output.close()
+
+
+def test_text_area_too_big(fb_file):
+    with pytest.raises(ValueError):
+        make(fb_file, height=5, width=9)
+
+
+def fake_sysfs(tmp_path, monkeypatch, **files):
+    sysfs = tmp_path / 'sysfs'
+    (sysfs / 'fb0').mkdir(parents=True)
+    for name, text in files.items():
+        (sysfs / 'fb0' / name).write_text(text)
+    monkeypatch.setattr(Output, 'SYSFS', str(sysfs))
+    device = tmp_path / 'fb0'
+    device.write_bytes(b'')
+    return str(device)
+
+
+def test_sysfs_visible_size_not_virtual(tmp_path, monkeypatch):
+    # Double-buffered:  the virtual screen is twice as tall as the real one
+    device = fake_sysfs(tmp_path, monkeypatch, modes='U:64x32p-60\nU:32x16p-60\n',
+                        virtual_size='80,64\n', bits_per_pixel='16\n', stride='160\n')
+    output = Output(2, 4, {'device':device})
+    try:
+        assert (output.fb_width, output.fb_height, output.stride) == (64, 32, 160)
+        assert (output.origin_x, output.origin_y) == (16, 8)
+    finally:
+        output.close()
+
+
+def test_sysfs_stride_from_virtual_size(tmp_path, monkeypatch):
+    device = fake_sysfs(tmp_path, monkeypatch, mode='U:64x32p-0\n',
+                        virtual_size='80,64\n', bits_per_pixel='32\n')
+    output = Output(2, 4, {'device':device})
+    try:
+        assert (output.fb_width, output.fb_height, output.stride) == (64, 32, 320)
+    finally:
+        output.close()
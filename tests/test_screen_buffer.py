@@ -0,0 +1,56 @@
+from outputs.screen_buffer import Output
+
+
+def make(height=3, width=10, **init):
+    return Output(height, width, init)
+
+
+def test_text_lands_on_screen():
+    screen = make()
+    screen.write('HELLO\nWORLD')
+    assert screen.snapshot() == ['HELLO     ', 'WORLD     ', '          ']
+    assert screen.cursor == (1, 5)
+
+
+def test_wraps_at_right_edge():
+    screen = make(width=4)
+    screen.write('ABCDEFG')
+    assert screen.screen_text() == 'ABCD\nEFG\n'
+
+
+def test_full_line_then_linefeed_is_one_line():
+    screen = make(width=4)
+    screen.write('ABCD\nE')
+    assert screen.screen_text() == 'ABCD\nE\n'
+
+
+def test_scrolls_into_scrollback():
+    screen = make(height=2)
+    screen.write('ONE\nTWO\nTHREE\nFOUR')
+    assert screen.screen_text() == 'THREE\nFOUR'
+    assert [line.rstrip() for line in screen.scrollback()] == ['ONE', 'TWO']
+    assert [line.rstrip() for line in screen.scrollback(1)] == ['TWO']
+
+
+def test_scrollback_limit():
+    screen = make(height=1, scrollback=2)
+    screen.write('A\nB\nC\nD')
+    assert [line.rstrip() for line in screen.scrollback()] == ['B', 'C']
+
+
+def test_ansi_cursor_sequences():
+    screen = make()
+    screen.write('ABCDEF\x1b[3DX\x1b[1GY\x1b[K')
+    assert screen.snapshot()[0] == 'Y         '
+    screen.write('\x1b[HZ')
+    assert screen.snapshot()[0] == 'Z         '
+    screen.write('\x1b[2J')
+    assert screen.screen_text() == '\n\n'
+
+
+def test_control_characters():
+    screen = make()
+    # The tab blanks out the B, the D gets backspaced over, and the bell
+    # is ignored
+    screen.write('AB\rC\tD\bE\x07')
+    assert screen.snapshot()[0] == 'C       E '
@@ -0,0 +1,72 @@
+import os
+import select
+
+import pytest
+
+from outputs.serial_port import Output
+
+
+@pytest.fixture
+def pty_pair():
+    # The output gets the slave end, like a real serial device.  The test
+    # reads what came out of the master end.
+    master, slave = os.openpty()
+    yield master, os.ttyname(slave)
+    os.close(slave)
+    os.close(master)
+
+
+def read_all(fd, expected):
+    data = b''
+    while len(data) < expected:
+        ready, _, _ = select.select([fd], [], [], 2)
+        if not ready:
+            break
+        data += os.read(fd, 1024)
+    return data
+
+
+def test_write_sends_crlf(pty_pair):
+    master, device = pty_pair
+    output = Output(24, 80, {'device':device, 'baud':9600})
+    try:
+        output.write('HELLO\nWORLD\n')
+        assert read_all(master, 14) == b'HELLO\r\nWORLD\r\n'
+    finally:
+        output.close()
+
+
+def test_write_without_crlf(pty_pair):
+    master, device = pty_pair
+    output = Output(24, 80, {'device':device, 'crlf':False, 'flow_control':'xonxoff'})
+    try:
+        output.write('A\nB')
+        assert read_all(master, 3) == b'A\nB'
+    finally:
+        output.close()
+
+
+def test_non_ascii_is_replaced(pty_pair):
+    master, device = pty_pair
+    output = Output(24, 80, {'device':device})
+    try:
+        output.write('50°')
+        assert read_all(master, 3) == b'50?'
+    finally:
+        output.close()
+
+
+def test_close_twice(pty_pair):
+    master, device = pty_pair
+    output = Output(24, 80, {'device':device})
+    output.close()
+    output.close()
+    assert output.fd is None
+
+
+def test_bad_settings(pty_pair):
+    master, device = pty_pair
+    with pytest.raises(ValueError):
+        Output(24, 80, {'device':device, 'baud':12345})
+    with pytest.raises(ValueError):
+        Output(24, 80, {'device':device, 'flow_control':'carrier pigeon'})